@@ -1,7 +1,7 @@
 
 
 from methods import MidPoint
-from kernels.abb import ABBSW, ABBAW
+from kernels.abb import plot_community
 
 # dictionary of flavor: kernel flags
 flavours = {
@@ -15,22 +15,22 @@ flavours = {
 # plots to ignore
 ignore = [ '12', '210', '291', '344', '327', '487', '13', '34', '296' ]
 
-def abb_init_kernels(L, U, N, flavour, plotname):
-    """Instantiate SW and AW kernels according to parameters and flavour.
+def abb_init_community(L, U, N, flavour, plotname):
+    """Instantiate an SW and AW community according to parameters and
+    flavour.
 
     Kernel flags are set based on the flavour.
     """
 
-    sw = ABBSW()
-    aw = ABBAW()
+    return plot_community(plotname, L, U, N, MidPoint(), flavours[flavour])
+
+
+def abb_init_kernels(L, U, N, flavour, plotname):
+    """Instantiate SW and AW kernels according to parameters and flavour.
 
-    for k in [ sw, aw ]:
-        k.L, k.U = L, U
-        k.setup(MidPoint(), N)
-        k.measurements('kernels/abb/%s.csv' % plotname, plotname)
+    Kernel flags are set based on the flavour.
+    """
 
-        flags = flavours[flavour]
-        for flag in flags:
-            setattr(k, flag, flags[flag])
+    c = abb_init_community(L, U, N, flavour, plotname)
 
-    return sw, aw
+    return c.sw, c.aw
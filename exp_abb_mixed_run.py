@@ -6,7 +6,7 @@ import time
 import numpy as np
 import cPickle as pickle
 
-from kernels.abb import ABBSW, ABBAW
+from kernels.abb import ABBSW, Community
 from methods.midpoint import MidPoint
 
 from utils.stats import dttnorm
@@ -95,12 +95,9 @@ for sw0, aw0, mix in initial_populations:
 
     logging.info("MIX: %s", mix)
 
-    sw = ABBSW()
-    aw = ABBAW()
-
-    for k in [ sw, aw ]:
-        k.L, k.U = L, U
-        k.setup(MidPoint(), N)
+    community = Community(L, U)
+    community.setup(MidPoint(), N)
+    sw = community.sw
 
     T = range(30)
     n = np.zeros((len(T)+1, 2, len(sw.x)))
@@ -110,11 +107,8 @@ for sw0, aw0, mix in initial_populations:
 
     for j, t in enumerate(T):
 
-        for k in [ sw, aw ]:
-            k.update(n[j, 0], n[j, 1], t)
-
-        n[j+1, 0] = sw.project(n[j, 0])
-        n[j+1, 1] = aw.project(n[j, 1])
+        community.update(n[j, 0], n[j, 1], t)
+        n[j+1] = community.project(n[j, 0], n[j, 1])
 
 
     plots[mix] = {}
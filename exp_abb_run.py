@@ -4,13 +4,11 @@ This runs all flavours of kernels as defined in exp_abb_kernels.py.
 """
 
 import logging
+import multiprocessing
 import time
 
-import numpy as np
-import cPickle as pickle
-
-from glob import glob
-from exp_abb_kernels import flavours, abb_init_kernels
+from exp_abb_kernels import flavours
+from utils.abbrun import abb_plots, abb_run, abb_collect
 
 
 ###############################################################################
@@ -20,6 +18,8 @@ N = 801
 L = 0.0
 U = 800.0
 
+workers = multiprocessing.cpu_count()   # processes used to run the plots
+
 
 ###############################################################################
 # init
@@ -42,57 +42,13 @@ logger.addHandler(info)
 
 logging.info("START: %s", time.asctime())
 
-for flavour in flavours:
-
-    logging.info("FLAVOUR: %s", flavour)
-
-    plots = {}
-    for plotfile in glob('kernels/abb/*.csv'):
-        if plotfile == 'kernels/abb/plotsizes.csv':
-            continue
-        plotname = plotfile.split('/')[-1].split('.')[0]
-
-        sw, aw = abb_init_kernels(L, U, N, flavour, plotname)
-
-        logging.info('PLOT: %s %f', plotname, sw.plot_size)
-
-        T = range(sw.first_year, sw.last_year+10)
-        n = np.zeros((len(T)+1, 2, len(sw.x)))
-
-        for j, t in enumerate(T):
-
-            logging.debug('year: %d', t)
-
-            if t in sw.years:
-                from_data = True
-                for k in [ sw, aw ]:
-                    k.set_n0(t)
-            else:
-                from_data = False
-
-            if from_data:
-                for k in [ sw, aw ]:
-                    k.sw0 = sw.n0
-                    k.aw0 = aw.n0
-
-                n[j+1, 0] = sw.first_projection() / sw.plot_size * 1e4
-                n[j+1, 1] = aw.first_projection() / aw.plot_size * 1e4
-
-            else:
-                # set current populations and resample
-                for k in [ sw, aw ]:
-                    k.update(n[j, 0], n[j, 1], t)
-
-                n[j+1, 0] = sw.project(n[j, 0])
-                n[j+1, 1] = aw.project(n[j, 1])
-
-
-        plots[plotname] = {}
-        plots[plotname]['nsw'] = np.asarray(n[:, 0])
-        plots[plotname]['naw'] = np.asarray(n[:, 1])
-        plots[plotname]['attrs'] = (L, U, N, T, sw.x, plotfile)
+plots = abb_plots()
 
+# per-plot results are written to out/abb/<flavour>/<L>_<U>_<N>/<plot>.pkl
+# as they finish, and plots that are already done are skipped
+abb_run(flavours, plots, workers=workers, L=L, U=U, N=N)
 
+for flavour in flavours:
+    abb_collect(flavour, flavours[flavour], plots, L=L, U=U, N=N)
 
-    with open('out/abb_%s.pkl' % flavour, 'w') as f:
-      pickle.dump(plots, f)
+logging.info("END: %s", time.asctime())
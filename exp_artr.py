@@ -1,6 +1,7 @@
 """ARTR experiment."""
 
 import logging
+import multiprocessing
 import time
 from itertools import product
 from collections import defaultdict
@@ -13,16 +14,20 @@ from scipy.stats.mstats import mquantiles
 
 from kernels.artr import ARTTRI
 from methods.midpoint import MidPoint
+from utils.ensemble import artr_ensemble
 
 
 ###############################################################################
 # config
 
-iterations = 1
+iterations = 1                           # > 1: parameter uncertainty ensemble
+workers    = multiprocessing.cpu_count() # processes used by ensembles
+seed       = None
 
 kernel = ARTTRI()
 method = MidPoint()
 N      = 400
+shift  = False                           # True: shifted stencils (see methods/shift.py)
 
 mortality_types = [ 'noexp' ]            # see kernels/artr.py 
 fecundity_types = [ 'uniform_noexp' ]    # see kernels/artr.py
@@ -62,7 +67,7 @@ logging.info("ARTR: mesh size: %d", N)
 method = MidPoint()
 
 kernel.reset_count()
-kernel.setup(method, N)
+kernel.setup(method, N, shift=shift)
 
 juvenile_mask = method.x <  adult_cutoff
 adult_mask    = method.x >= adult_cutoff
@@ -80,27 +85,33 @@ for mortality, fecundity in product(mortality_types, fecundity_types):
     juveniles   = np.zeros((iterations, len(T)+1))
     adults      = np.zeros((iterations, len(T)+1))
 
-    for k in range(iterations):
-
-        logging.info("ARTR: iteration: %d", k)
-
+    if iterations > 1:
+        ensemble = artr_ensemble(iterations, workers=workers, N=N,
+                                 mortality=mortality, fecundity=fecundity,
+                                 adult_cutoff=adult_cutoff, shift=shift,
+                                 seed=seed)
+        projections = ensemble['projections']
+        populations = ensemble['populations']
+        juveniles   = ensemble['juveniles']
+        adults      = ensemble['adults']
+
+    else:
+        # single (mean parameter) projection, ensembles are run by
+        # utils.ensemble above
         n0 = method.histogram(kernel.n0)
 
-        projections[k, 0] = n0
-        populations[k, 0] = sum(n0)
-        juveniles[k, 0]   = sum(n0 * juvenile_mask)
-        adults[k, 0]      = sum(n0 * adult_mask)
+        projections[0, 0] = n0
+        populations[0, 0] = sum(n0)
+        juveniles[0, 0]   = sum(n0 * juvenile_mask)
+        adults[0, 0]      = sum(n0 * adult_mask)
 
-        logging.debug("ARTR: iter: %d, step: 0, population: %f",
-                      k, populations[k, 0])
+        logging.debug("ARTR: step: 0, population: %f", populations[0, 0])
 
         for j, t in enumerate(T):
 
             logging.info("ARTR: time: %d (%d)", t, j)
 
             kernel.update(t)
-            if iterations > 1:
-                kernel.draw_parameters(t)
 
             if j == 0:
                 n1 = kernel.first_projection()
@@ -118,40 +129,39 @@ for mortality, fecundity in product(mortality_types, fecundity_types):
                 
                 n1 += kernel.population_fecundity(n0)
 
-            if iterations == 1:
-                for covariat in covariats:
+            for covariat in covariats:
 
-                    if elasticity_from_data:
-                        c0 = method.histogram(kernel.measurements(t))
-                        if not np.any(c0):
-                            elasticity[covariat].append(np.nan)
-                            continue
-                    else:
-                        c0 = n0
+                if elasticity_from_data:
+                    c0 = method.histogram(kernel.measurements(t))
+                    if not np.any(c0):
+                        elasticity[covariat].append(np.nan)
+                        continue
+                else:
+                    c0 = n0
 
-                    c1 = kernel.project(c0)
+                c1 = kernel.project(c0)
 
-                    kernel.tweak(covariat, 1.1)
-                    kernel.update(t)
-                    c2 = kernel.project(c0)
+                kernel.tweak(covariat, 1.1)
+                kernel.update(t)
+                c2 = kernel.project(c0)
 
-                    gr1 = method.growth_rate(c0, c1)
-                    gr2 = method.growth_rate(c0, c2)
+                gr1 = method.growth_rate(c0, c1)
+                gr2 = method.growth_rate(c0, c2)
 
-                    logging.debug("ELASTICITY: step: %d, "
-                                  + "covariat: %s, lambda relative: %f", 
-                                  j, covariat, gr2/gr1)
-                    elasticity[covariat].append(gr2/gr1)
+                logging.debug("ELASTICITY: step: %d, "
+                              + "covariat: %s, lambda relative: %f", 
+                              j, covariat, gr2/gr1)
+                elasticity[covariat].append(gr2/gr1)
 
-                kernel.tweak(None, 1.0)
+            kernel.tweak(None, 1.0)
 
-            projections[k, j+1] = n1
-            populations[k, j+1] = method.total_population(n1)
-            juveniles[k, j+1]   = method.total_population(n1 * juvenile_mask)
-            adults[k, j+1]      = method.total_population(n1 * adult_mask)
+            projections[0, j+1] = n1
+            populations[0, j+1] = method.total_population(n1)
+            juveniles[0, j+1]   = method.total_population(n1 * juvenile_mask)
+            adults[0, j+1]      = method.total_population(n1 * adult_mask)
 
-            logging.debug("ARTR: iter: %d, step: %d, population: %f",
-                          k, j+1, populations[k, j+1])
+            logging.debug("ARTR: step: %d, population: %f",
+                          j+1, populations[0, j+1])
 
             n0 = n1
 
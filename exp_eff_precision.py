@@ -0,0 +1,78 @@
+"""Single precision validation.
+
+Projects the kernels of exp_eff_run.py with projection matrices stored
+in single and in double precision, and reports the relative
+differences of the final populations and of the growth rates.
+"""
+
+import logging
+
+import numpy as np
+
+from methods import *
+from kernels import *
+
+
+###############################################################################
+# config
+
+kernels = [
+    (Exact, {}),
+    (EED, {}),
+    (EED, { 'growth_type': 'slow' }),
+    (Zuidema, {}),
+]
+
+methods = [
+    (MidPoint, {}),
+    (GaussQuad, { 'k': 9 }),
+]
+
+mesh_sizes = [ 100, 200, 400 ]
+
+
+###############################################################################
+# compare
+
+def project(kernel, method, N, precision):
+    """Return the populations and growth rate of *kernel*."""
+
+    kernel.reset_count()
+    kernel.setup(method, N, precision=precision)
+    kernel.update(0)
+
+    n = kernel.first_projection()
+    populations = [ kernel.population(n) ]
+    for t in kernel.T[1:]:
+        n = kernel.project(n)
+        populations.append(kernel.population(n))
+
+    return np.asarray(populations), kernel.asymptotic_growth_rate()
+
+
+def precision_errors(kernel, method, N):
+    """Return the relative errors of the single precision populations
+    (largest over all steps) and growth rate."""
+
+    pop2, gr2 = project(kernel, method, N, 'double')
+    pop1, gr1 = project(kernel, method, N, 'single')
+
+    return abs(pop1 - pop2).max() / abs(pop2).max(), abs(gr1 - gr2) / abs(gr2)
+
+
+###############################################################################
+# main
+
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+
+for Kernel, kernel_init_args in kernels:
+    for Method, method_init_args in methods:
+        for N in mesh_sizes:
+
+            kernel = Kernel(**kernel_init_args)
+            method = Method(**method_init_args)
+
+            pop_err, gr_err = precision_errors(kernel, method, N)
+
+            logging.info("PRECISION: %-8s %-18s %5d  population: %.2e  lambda: %.2e",
+                         kernel.name, method.name, N, pop_err, gr_err)
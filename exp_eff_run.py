@@ -11,6 +11,7 @@ from time import clock
 
 from methods import *
 from kernels import *
+from utils.cache import MatrixCache
 
 from exp_eff_mesh import mesh_sizes
 
@@ -20,6 +21,12 @@ from exp_eff_mesh import mesh_sizes
 norm_order  = np.inf
 growth_rate = True
 
+# if set, the matrices of the reference solutions are cached on disk
+# and re-used by later runs (the measured matrices are never cached, so
+# that their counts and times are those of the assembly)
+cache_dir   = None
+cache_bytes = 2**33
+
 kernels = [
     (Exact, {}),
     (EED, {}),
@@ -60,8 +67,11 @@ methods = [
 # compute and plot projections
 
 def compute_projections(kernel, method, mesh_size,
-                        growth_rate=False, plot_kernel=False):
-    """Compute projections and populations."""
+                        growth_rate=False, plot_kernel=False, tol=1e-12):
+    """Compute projections and populations.
+
+    The growth rate is computed to the relative tolerance *tol*.
+    """
 
     logging.info("PROJECT: %s, %s, %d", kernel.name, method.name, mesh_size)
 
@@ -75,7 +85,8 @@ def compute_projections(kernel, method, mesh_size,
 
     if plot_kernel:
       import pylab
-      pylab.imshow(kernel.method.A)
+      A = kernel.method.A
+      pylab.imshow(A.toarray() if hasattr(A, 'toarray') else A)
       pylab.show()
 
     projections = np.zeros((len(T), len(kernel.x)))
@@ -96,14 +107,13 @@ def compute_projections(kernel, method, mesh_size,
         n0 = n1
 
     if growth_rate:
-        from scipy.sparse.linalg.eigen import eigs, ArpackNoConvergence
+        from scipy.sparse.linalg.eigen import ArpackNoConvergence
 
         logging.debug("PROJECT: computing dominant eigenvalue")
         try:
-            evals = eigs(kernel.projection_matrix,
-                         k=1, tol=1e-14, maxiter=500, sigma=1.0, which='LM',
-                         return_eigenvectors=False)
-            gr = evals[0]
+            # power iteration (see utils/eigen.py), warm started from
+            # the eigenvector of the previous mesh
+            gr = kernel.asymptotic_growth_rate(tol)
 
         except ArpackNoConvergence as err:
             logging.info("WARNING: EVALS: ARPACK didn't converge")
@@ -141,6 +151,11 @@ logging.info("PROJECT: RUN STARTED AT: %s", time.asctime())
 
 measurements = collections.defaultdict(dict)
 
+if cache_dir:
+    cache = MatrixCache(cache_dir, cache_bytes)
+else:
+    cache = None
+
 for Kernel, kernel_init_args in kernels:
 
     kernel = Kernel(**kernel_init_args)
@@ -148,12 +163,17 @@ for Kernel, kernel_init_args in kernels:
     # compute a reference solution
     logging.info("REFERENCE: computing reference solution")
 
+    kernel.cache = cache
+
     method = GaussQuad('GaussLegendre', k=13)
-    proj, pop, gr, time = compute_projections(kernel, method, 800, growth_rate)
+    proj, pop, gr, time = compute_projections(kernel, method, 800, growth_rate,
+                                              tol=1e-14)
 
     ref_pop = pop[-1]
     ref_gr  = gr
 
+    kernel.cache = None
+
     # cycle through methods and project!
     for Method, method_init_args in methods:
 
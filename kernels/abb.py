@@ -17,6 +17,7 @@ The plot size is assumed to be in units of m^2.
 
 """
 
+import copy
 import logging
 import numpy as np
 
@@ -27,7 +28,74 @@ from utils.io import read_csv
 
 from base import Kernel
 
-plotsizes = read_csv('kernels/abb/plotsizes.csv')
+
+def tail_sums(P, v):
+    """Return r[j] = sum_{k >= j} P[k] v[k] (reverse cumulative sums)."""
+
+    return np.cumsum((P * v)[::-1])[::-1]
+
+
+def competition_indices(x, P, basal_area, nsw, naw):
+    """Return the competition indices at every mesh point *x* (with
+    quadrature weights *P* and basal areas *basal_area*).
+
+    All indices are sums over the trees with dbh greater than the
+    mesh points, and are computed with reverse cumulative sums.
+    """
+
+    ba = basal_area
+
+    return {
+        'sw_pct':  tail_sums(P, nsw) / 1e3,              # # / 10 m^2
+        'aw_pct':  tail_sums(P, naw) / 1e3,              # # / 10 m^2
+        'sw_psd':  tail_sums(P, nsw * x) / 1e3,          # m / ha
+        'aw_pba':  tail_sums(P, naw * ba) / 1e6,         # m^2 / ha
+        'net_pba': tail_sums(P, (naw + nsw) * ba) / 1e6, # m^2 / ha
+    }
+
+
+class MeasurementIndex(object):
+    """Sorted dbh measurements with suffix sums of counts, diameters and
+    basal areas.
+
+    The sums over all measured trees with dbh greater than any batch
+    of query sizes are looked up with a binary search.
+    """
+
+    def __init__(self, dbh):
+
+        d = np.sort(np.asarray(dbh, dtype=float).ravel())
+
+        self.dbh = d
+        self.n   = len(d)
+
+        # suffix sums, with a trailing zero for queries above all trees
+        self._psd = np.append(tail_sums(1.0, d), 0.0)
+        self._pba = np.append(tail_sums(1.0, pi * (d/2.0)**2), 0.0)
+
+
+    def greater(self, x):
+        """Return the index of the first tree with dbh greater than *x*."""
+
+        return np.searchsorted(self.dbh, x, side='right')
+
+
+    def count(self, x):
+        """Return the number of trees with dbh greater than *x*."""
+
+        return self.n - self.greater(x)
+
+
+    def sum_dbh(self, x):
+        """Return the sum of the dbhs of trees with dbh greater than *x*."""
+
+        return self._psd[self.greater(x)]
+
+
+    def basal_area(self, x):
+        """Return the basal area of trees with dbh greater than *x*."""
+
+        return self._pba[self.greater(x)]
 
 
 class ABB(Kernel):
@@ -36,6 +104,9 @@ class ABB(Kernel):
 
         Kernel.__init__(self)
 
+        # the competition covariates change every year
+        self.time_dependent = True
+
         self.sw_mort     = 'model'
         self.competition = True
         self.no_mort     = False
@@ -43,8 +114,9 @@ class ABB(Kernel):
 
     def measurements(self, raw_meas, plotname):
 
-        raw_meas = read_csv(raw_meas)
-        plotsize = [ x.plotsize for x in plotsizes if x.plot == plotname ]
+        raw_meas  = read_csv(raw_meas)
+        plotsizes = read_csv('kernels/abb/plotsizes.csv')
+        plotsize  = [ x.plotsize for x in plotsizes if x.plot == plotname ]
         if len(plotsize) == 1:
             self.plot_size = float(plotsize[0])
         else:
@@ -64,17 +136,38 @@ class ABB(Kernel):
         self.last_year  = self.years[-1]
 
 
-    def update(self, nsw, naw, t, **kwargs):
+    def setup(self, method, N, **kwargs):
+
+        Kernel.setup(self, method, N, **kwargs)
+
+        # basal area of each mesh point
+        self._basal_area = pi * (self.x/2.0)**2
+
+
+    def competition_indices(self, nsw, naw):
+        """Return the competition indices at every mesh point."""
+
+        return competition_indices(self.x, self.method.P, self._basal_area,
+                                   nsw, naw)
+
+
+    def update(self, nsw, naw, t, indices=None, **kwargs):
+        """Set the current populations and resample.
+
+        The competition indices are computed from *nsw* and *naw*,
+        unless they are given in *indices* (see Community).
+        """
+
         self.nsw = nsw
         self.naw = naw
 
         # cache sw_psd, aw_pba etc...
-        ix = np.array(range(len(self.x)))
-        self._sw_psd  = self.sw_psd(self.x, ix)
-        self._sw_pct  = self.sw_pct(self.x, ix)
-        self._aw_pct  = self.aw_pct(self.x, ix)
-        self._aw_pba  = self.aw_pba(self.x, ix)
-        self._net_pba = self.net_pba(self.x, ix)
+        c = indices if indices is not None else self.competition_indices(nsw, naw)
+        self._sw_psd  = c['sw_psd']
+        self._sw_pct  = c['sw_pct']
+        self._aw_pct  = c['aw_pct']
+        self._aw_pba  = c['aw_pba']
+        self._net_pba = c['net_pba']
 
         # at this point, eg, _sw_pct[i] is the number of spruce with
         # dbh greater than x[i] where x corresponds to the methods'
@@ -83,13 +176,52 @@ class ABB(Kernel):
         self.method.sample(self, t)
 
 
+    def kernel(self, x, y, t, ix=None, **kwargs):
+
+        if ix is not None:
+            mu, sd, s = self.growth_survival(x, ix)
+        else:
+            mu, sd, s = self.growth_survival(np.array([ x ]))
+
+        g = dnorm(y, mu, sd=sd)
+        # g = dtnorm(y, mu=mu, a0=dbh, sd=self.sd)
+
+        return s * g
+
+
+    def kernel_matrix(self, x, y, t, ix=None, **kwargs):
+
+        x = np.asarray(x)
+        y = np.asarray(y)
+
+        mu, sd, s = self.growth_survival(x, ix)
+        g = dnorm(y[:, np.newaxis], mu[np.newaxis, :], sd=sd)
+
+        return s * g
+
+
+    def normal_growth(self, t):
+        """Return mu, sd and s at the mesh points, such that
+        k(x[j], y, t) = s[j] dnorm(y, mu[j], sd).
+
+        The growth means and survivals are computed in O(N) from the
+        cached competition indices (see MidPoint.sample_normal).
+        """
+
+        return self.growth_survival(self.x, ix=slice(None))
+
+
+    def band(self, x, t, tol, ix=None, **kwargs):
+
+        mu, sd, s = self.growth_survival(np.asarray(x), ix)
+
+        return self.normal_band(mu, sd, tol)
+
+
     def sw_pct(self, x, ix):
         """Return number of Spruce with dbh greater than *x*."""
 
-        r = np.empty(x.shape)
-
-        for i, j in enumerate(ix):
-            r[i] = np.dot(self.method.P[j:], self.nsw[j:])
+        r = tail_sums(self.method.P, self.nsw)[ix]
 
         return r / 1e3          # convert # / ha to # / 10 m^2
 
@@ -97,10 +229,7 @@ class ABB(Kernel):
     def aw_pct(self, x, ix):
         """Return number of Spruce with dbh greater than *x*."""
 
-        r = np.empty(x.shape)
-
-        for i, j in enumerate(ix):
-            r[i] = np.dot(self.method.P[j:], self.naw[j:])
+        r = tail_sums(self.method.P, self.naw)[ix]
 
         return r / 1e3          # convert # / ha to # / 10 m^2
 
@@ -108,10 +237,7 @@ class ABB(Kernel):
     def sw_psd(self, x, ix):
         """Return Spruce sum-of-diameters for Spruce with dbh greater than *x*."""
 
-        r = np.empty(x.shape)
-
-        for i, j in enumerate(ix):
-            r[i] = np.dot(self.method.P[j:], self.nsw[j:] * self.x[j:])
+        r = tail_sums(self.method.P, self.nsw * self.x)[ix]
 
         return r / 1e3          # convert mm / ha to m / ha
 
@@ -119,10 +245,7 @@ class ABB(Kernel):
     def aw_pba(self, x, ix):
         """Return Aspen basal area for Aspen with dbh greater than *x*."""
 
-        r = np.empty(x.shape)
-
-        for i, j in enumerate(ix):
-            r[i] = np.dot(self.method.P[j:], self.naw[j:] * pi * (self.x[j:]/2.0)**2)
+        r = tail_sums(self.method.P, self.naw * self._basal_area)[ix]
 
         return r / 1e6          # convert mm^2 / ha to m^2 / ha
 
@@ -130,53 +253,70 @@ class ABB(Kernel):
     def net_pba(self, x, ix):
         """Return total basal area for trees with dbh greater than *x*."""
 
-        r = np.empty(x.shape)
-
-        for i, j in enumerate(ix):
-            r[i] = np.dot(self.method.P[j:], (self.naw[j:] + self.nsw[j:]) * pi * (self.x[j:]/2.0)**2)
+        r = tail_sums(self.method.P, (self.naw + self.nsw) * self._basal_area)[ix]
 
         return r / 1e6          # convert mm^2 / ha to m^2 / ha
 
 
+    @property
+    def sw0(self):
+        return self._sw0
+
+    @sw0.setter
+    def sw0(self, dbh):
+        # index the measurements once per measurement year
+        self._sw0 = dbh
+        self._sw0_index = MeasurementIndex(dbh)
+
+
+    @property
+    def aw0(self):
+        return self._aw0
+
+    @aw0.setter
+    def aw0(self, dbh):
+        self._aw0 = dbh
+        self._aw0_index = MeasurementIndex(dbh)
+
+
     def sw_pct_from_meas(self, x):
         """Return number of Spruce with dbh greater than *x*."""
 
-        r = [ d for d in self.sw0 if d > x ]
+        r = self._sw0_index.count(x)
 
-        return float(len(r)) / (self.plot_size / 10.0)  # convert # / plot_size to # / 10 m^2
+        return r / (self.plot_size / 10.0)      # convert # / plot_size to # / 10 m^2
 
 
     def aw_pct_from_meas(self, x):
         """Return number of aspen with dbh greater than *x*."""
 
-        r = [ d for d in self.aw0 if d > x ]
+        r = self._aw0_index.count(x)
 
-        return float(len(r)) / (self.plot_size / 10.0)  # convert # / plot_size to # / 10 m^2
+        return r / (self.plot_size / 10.0)      # convert # / plot_size to # / 10 m^2
 
 
     def sw_psd_from_meas(self, x):
         """Return Spruce sum-of-diameters for Spruce with dbh greater than *x*."""
 
-        r = [ d for d in self.sw0 if d > x ]
+        r = self._sw0_index.sum_dbh(x)
 
-        return float(sum(r)) / (self.plot_size / 10.0)  # convert mm / plot_size to m / ha
+        return r / (self.plot_size / 10.0)      # convert mm / plot_size to m / ha
 
 
     def aw_pba_from_meas(self, x):
         """Return Aspen basal area for Aspen with dbh greater than *x*."""
 
-        r = [ pi * (d/2.0)**2 for d in self.aw0 if d > x ]
+        r = self._aw0_index.basal_area(x)
 
-        return sum(r) / (self.plot_size * 100.0)      # convert mm^2 / plot_size to m^2 / ha
+        return r / (self.plot_size * 100.0)     # convert mm^2 / plot_size to m^2 / ha
 
 
     def net_pba_from_meas(self, x):
         """Return total basal area for trees with dbh greater than *x*."""
 
-        r = [ pi * (d/2.0)**2 for d in self.sw0 if d > x ]
-        r.extend([ pi * (d/2.0)**2 for d in self.aw0 if d > x ])
+        r = self._sw0_index.basal_area(x) + self._aw0_index.basal_area(x)
 
-        return sum(r) / (self.plot_size * 100.0)      # convert mm^2 / plot_size to m^2 / ha
+        return r / (self.plot_size * 100.0)     # convert mm^2 / plot_size to m^2 / ha
 
 
 
@@ -204,22 +344,26 @@ class ABBSW(ABB):
         self.n0 = np.asarray(self.meas['SW'][year])
 
 
-    def kernel(self, x, y, t, ix=None, **kwargs):
+    def growth_survival(self, x, ix=None):
+        """Return growth mean, growth sd and survival for source dbhs *x*.
+
+        If *ix* is given, the competition covariates are looked up in
+        the cached mesh arrays, otherwise they are computed from the
+        measurements.
+        """
 
         if ix is not None:
-            one    = np.ones(len(x))
-            dbh    = x
             sw_psd = self._sw_psd[ix]
             sw_pct = self._sw_pct[ix]
             aw_pct = self._aw_pct[ix]
             aw_pba = self._aw_pba[ix]
         else:
-            one    = np.ones(len(y))
-            dbh    = np.array(len(y) * [x])
-            sw_psd = np.array(len(y) * [self.sw_psd_from_meas(x)])
-            sw_pct = np.array(len(y) * [self.sw_pct_from_meas(x)])
-            aw_pct = np.array(len(y) * [self.aw_pct_from_meas(x)])
-            aw_pba = np.array(len(y) * [self.aw_pba_from_meas(x)])
+            sw_psd = self.sw_psd_from_meas(x)
+            sw_pct = self.sw_pct_from_meas(x)
+            aw_pct = self.aw_pct_from_meas(x)
+            aw_pba = self.aw_pba_from_meas(x)
+
+        dbh = x
 
         # growth
         if self.competition:
@@ -229,26 +373,23 @@ class ABBSW(ABB):
             params = self.growth_params_no_comp
             sd = self.sd_no_comp
 
-        xi = np.vstack([ one, dbh, sw_psd, aw_pct + sw_pct, dbh**2 ])
-        mu = np.dot(params, xi)
-        mu = np.where(mu > dbh, mu, dbh)
-
-        g = dnorm(y, mu, sd=sd)
-        # g = dtnorm(y, mu=mu, a0=dbh, sd=self.sd)
+        b  = params
+        mu = b[0] + b[1]*dbh + b[2]*sw_psd + b[3]*(aw_pct + sw_pct) + b[4]*dbh**2
+        mu = np.maximum(mu, dbh)
 
         # survival
         if self.no_mort:
             s = 1.00
         elif self.sw_mort == 'model':
-            xi = np.vstack([ one, dbh, sw_psd, aw_pba ])
-            mu = np.dot(self.survival_params, xi)
-            s  = exp(mu) / (1.0 + exp(mu))
+            b   = self.survival_params
+            eta = b[0] + b[1]*dbh + b[2]*sw_psd + b[3]*aw_pba
+            s  = exp(eta) / (1.0 + exp(eta))
         elif self.sw_mort == 'const':
             s = 0.99
         else:
             raise ValueError("invalid sw_mort, should be 'model' or 'const'")
 
-        return s * g
+        return mu, sd, np.broadcast_to(s, dbh.shape)
 
 
 class ABBAW(ABB):
@@ -272,23 +413,24 @@ class ABBAW(ABB):
         self.n0 = np.asarray(self.meas['AW'][year])
 
 
-    def kernel(self, x, y, t, ix=None, **kwargs):
+    def growth_survival(self, x, ix=None):
+        """Return growth mean, growth sd and survival for source dbhs *x*.
+
+        If *ix* is given, the competition covariates are looked up in
+        the cached mesh arrays, otherwise they are computed from the
+        measurements.
+        """
 
         if ix is not None:
-            one     = np.ones(len(x))
-            dbh     = x
-            # di      = (y - x) / 10.0
             sw_psd  = self._sw_psd[ix]
             # aw_pba  = self._aw_pba[ix]
             # net_pba = self._net_pba[ix]
         else:
-            one     = np.ones(len(y))
-            dbh     = np.array(len(y) * [x])
-            # di      = y - x
-            sw_psd  = np.array(len(y) * [ self.sw_psd_from_meas(x)  ])
-            # aw_pba  = np.array(len(y) * [ self.aw_pba_from_meas(x)  ])
-            # net_pba = np.array(len(y) * [ self.net_pba_from_meas(x) ])
+            sw_psd  = self.sw_psd_from_meas(x)
+            # aw_pba  = self.aw_pba_from_meas(x)
+            # net_pba = self.net_pba_from_meas(x)
 
+        dbh = x
 
         # growth
         if self.competition:
@@ -298,12 +440,9 @@ class ABBAW(ABB):
             params = self.growth_params_no_comp
             sd     = self.sd_no_comp
 
-        xi = np.vstack([ one, dbh, sw_psd, dbh**2 ])
-        mu = np.dot(params, xi)
-        mu = np.where(mu > dbh, mu, dbh)
-
-        g = dnorm(y, mu, sd=sd)
-        # g = dtnorm(y, mu=mu, a0=dbh, sd=self.sd)
+        b  = params
+        mu = b[0] + b[1]*dbh + b[2]*sw_psd + b[3]*dbh**2
+        mu = np.maximum(mu, dbh)
 
         # # survival
         # xi = np.vstack([ one, dbh, dbh**2, di, dbh**2 * net_pba ])
@@ -316,4 +455,104 @@ class ABBAW(ABB):
         else:
             s = 0.99
 
-        return s * g
+        return mu, sd, np.broadcast_to(s, dbh.shape)
+
+
+class Community(object):
+    """Coupled SW and AW kernels of a stand.
+
+    The kernels share the mesh on [L, U] and the quadrature weights of
+    one method (each kernel gets a shallow copy of the method to hold
+    its own projection matrix), and the competition indices are
+    computed once per time step and handed to both kernels before they
+    are sampled.
+    """
+
+    def __init__(self, L, U, sw=None, aw=None):
+
+        self.L = L
+        self.U = U
+
+        self.sw = sw if sw is not None else ABBSW()
+        self.aw = aw if aw is not None else ABBAW()
+        self.kernels = [ self.sw, self.aw ]
+
+
+    def setup(self, method, N, **kwargs):
+
+        method.setup(self.L, self.U, N, **kwargs)
+
+        self.method = method
+        self.x = method.x
+
+        # basal area of each mesh point
+        self._basal_area = pi * (self.x/2.0)**2
+
+        for k in self.kernels:
+            k.L, k.U = self.L, self.U
+            k.method = copy.copy(method)
+            k.x = self.x
+            k._basal_area = self._basal_area
+
+
+    def measurements(self, raw_meas, plotname):
+        """Read the measurements of the plot once for both kernels."""
+
+        sw, aw = self.sw, self.aw
+        sw.measurements(raw_meas, plotname)
+
+        for attr in [ 'plot_size', 'meas', 'years', 'first_year', 'last_year' ]:
+            setattr(aw, attr, getattr(sw, attr))
+
+
+    def set_n0(self, year):
+        """Set the initial populations (and the measurements used for
+        the competition indices) of both kernels to those of *year*."""
+
+        sw, aw = self.sw, self.aw
+        sw.set_n0(year)
+        aw.set_n0(year)
+
+        sw.sw0 = sw.n0
+        sw.aw0 = aw.n0
+        for attr in [ '_sw0', '_sw0_index', '_aw0', '_aw0_index' ]:
+            setattr(aw, attr, getattr(sw, attr))
+
+
+    def set_flags(self, flags):
+        for k in self.kernels:
+            for flag in flags:
+                setattr(k, flag, flags[flag])
+
+
+    def competition_indices(self, nsw, naw):
+        """Return the competition indices at every mesh point."""
+
+        return competition_indices(self.x, self.method.P, self._basal_area,
+                                   nsw, naw)
+
+
+    def update(self, nsw, naw, t):
+        """Set the current populations and resample both kernels."""
+
+        c = self.competition_indices(nsw, naw)
+        for k in self.kernels:
+            k.update(nsw, naw, t, indices=c)
+
+
+    def project(self, nsw, naw):
+        """Return the projections of the SW and AW populations."""
+
+        return self.sw.project(nsw), self.aw.project(naw)
+
+
+def plot_community(plotname, L, U, N, method, flags={}):
+    """Return the community of the plot *plotname*, set up with *method*
+    on N cells of [L, U], with the kernel *flags* set."""
+
+    c = Community(L, U)
+    c.setup(method, N)
+    c.measurements('kernels/abb/%s.csv' % plotname, plotname)
+    c.set_flags(flags)
+
+    return c
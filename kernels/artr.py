@@ -5,7 +5,7 @@ import logging
 import numpy as np
 
 from numpy import sqrt, exp, log
-from utils.io import read_csv
+from utils.io import read_csv, read_columns
 from utils.stats import dnorm
 
 from base import Kernel
@@ -26,7 +26,7 @@ class ARTTRI(Kernel):
         self.time_dependent = True
 
         # read climate data and measurements (cm^2)
-        climate      = read_csv('kernels/artr/climate.csv')
+        climate      = read_columns('kernels/artr/climate.csv')
         measurements = read_csv('kernels/artr/survivalDataARTR.csv')
         years        = sorted(list(set([ int(x.year) for x in measurements ])))
         fecundity_measurements = read_csv('kernels/artr/fecdat.csv')
@@ -49,6 +49,9 @@ class ARTTRI(Kernel):
         self._tweak_covariat = None
         self._tweak_factor   = 1.0
 
+        self._row       = None
+        self._covariats = {}
+
 
         # set parameters
         self.params = {
@@ -104,21 +107,38 @@ class ARTTRI(Kernel):
         return self.log_areas.get(t, [])
 
     
-    def setup(self, method, N):
+    def setup(self, method, N, **kwargs):
 
-        Kernel.setup(self, method, N)
+        Kernel.setup(self, method, N, **kwargs)
 
         self.row = 1
 
         logging.debug("ARTR: setup: climate row: %d", self.row)
 
 
+    @property
+    def row(self):
+        return self._row
+
+    @row.setter
+    def row(self, row):
+        # the covariats of the climate row are cached when it is set
+        self._row = row
+        self.cache_covariats()
+
+
+    def climate_row(self, t):
+        """Return the climate row(s) used for year(s) *t*."""
+
+        return np.maximum(0, np.asarray(t) - int(self.years[0]) - 1)
+
+
     def update(self, t):
 
         Kernel.update(self, t)
 
         # set row for looking up climate data
-        self.row = max(0, t - int(self.years[0]) - 1)
+        self.row = int(self.climate_row(t))
 
         # set default parameters
         self.growth_params    = self.params['growth']['mean']
@@ -130,20 +150,27 @@ class ARTTRI(Kernel):
                       + "params set to means", t, self.row)
 
 
-    def draw_parameters(self, t):
+    def draw_parameters(self, t, rng=None):
+        """Draw the parameters from their sampling distributions.
+
+        The draws are taken from the RandomState *rng* if given, and
+        from the global numpy random state otherwise.
+        """
+
+        rng = rng or np.random
 
         # growth
-        self.growth_params = np.random.multivariate_normal(
+        self.growth_params = rng.multivariate_normal(
             self.params['growth']['mean'], 
             self.params['growth']['covariance'])
 
         # survival
-        self.survival_params = np.random.multivariate_normal(
+        self.survival_params = rng.multivariate_normal(
             self.params['survival']['mean'], 
             self.params['survival']['covariance'])
 
         # fecundity
-        self.fecundity_params = np.random.multivariate_normal(
+        self.fecundity_params = rng.multivariate_normal(
             self.params['fecundity']['mean'], 
             self.params['fecundity']['covariance'])
 
@@ -157,15 +184,41 @@ class ARTTRI(Kernel):
         self._tweak_covariat = covariat
         self._tweak_factor   = factor
 
+        self.cache_covariats()
 
-    def covariat(self, name):
 
-        v = float(getattr(self.climate[self.row], name))
+    def cache_covariats(self):
+
+        if self._row is None:
+            return
+
+        self._covariats = dict((name, float(v))
+                               for name, v in self.covariats(self._row).items())
+
+
+    def covariats(self, rows=None):
+        """Return the (tweaked) covariats of the climate rows *rows*.
+
+        Returns a dict of arrays (or floats if *rows* is an integer)
+        keyed by covariat name.  By default, all rows are returned.
+        """
+
+        if rows is None:
+            rows = slice(None)
 
-        if name == self._tweak_covariat:
-            v *= self._tweak_factor
+        r = {}
+        for name, v in self.climate.items():
+            v = v[rows]
+            if name == self._tweak_covariat:
+                v = v * self._tweak_factor
+            r[name] = v
 
-        return v
+        return r
+
+
+    def covariat(self, name):
+
+        return self._covariats[name]
 
 
     def survival(self, x, t):
@@ -187,14 +240,37 @@ class ARTTRI(Kernel):
             return self.mortality_type
 
 
-    def growth(self, x, y, t):
+    def growth_mean(self, x, t):
+
+        pptWin2   = self.covariat('pptWin2')
+        TmeanSum1 = self.covariat('TmeanSum1')
+
+        a0, a1, a2, a3 = self.growth_params
+
+        return a0 + a1 * x + a2 * pptWin2 + a3 * TmeanSum1
+
+
+    def shift_decomposition(self, t):
+        """Return s, a, c and g such that the survival and growth part
+        of the kernel is s(x) g(y - a x - c).
+
+        The climate only changes the survival s and the shift c.
+        """
 
         pptWin2   = self.covariat('pptWin2')
         TmeanSum1 = self.covariat('TmeanSum1')
 
         a0, a1, a2, a3 = self.growth_params
 
-        m = a0 + a1 * x + a2 * pptWin2 + a3 * TmeanSum1
+        s = lambda x: self.survival(x, t)
+        g = lambda z: dnorm(z, mu=0.0, sd=sqrt(1.79))
+
+        return s, a1, a0 + a2 * pptWin2 + a3 * TmeanSum1, g
+
+
+    def growth(self, x, y, t):
+
+        m = self.growth_mean(x, t)
         v = 1.79
 
         return dnorm(y, mu=m, sd=sqrt(v))
@@ -202,6 +278,16 @@ class ARTTRI(Kernel):
 
     def fecundity(self, x, y, t):
 
+        [ (rpg, fa) ] = self.low_rank_terms(x, y, t)
+
+        return rpg * fa
+
+
+    def low_rank_terms(self, x, y, t):
+
+        if self.fecundity_type == 'population':
+            return []
+
         y = np.asarray(y)
 
         recpptApr     = self.covariat('recpptApr')
@@ -226,10 +312,10 @@ class ARTTRI(Kernel):
             rpg = (a0 + a1*recpptApr + a2*recFebMarSnow)*exp(x)/40000.0
             fa  = 0.25 * exp(-0.25*exp(y))
 
-        return rpg * fa
+        return [ (rpg, fa) ]
 
 
-    def kernel(self, x, y, t):
+    def kernel(self, x, y, t, **kwargs):
 
         self.increment_count(x, y)
 
@@ -244,6 +330,40 @@ class ARTTRI(Kernel):
         return s*g + f
 
 
+    def kernel_matrix(self, x, y, t, include_low_rank=True, **kwargs):
+
+        self.increment_count_matrix(x, y)
+
+        x = np.asarray(x)[np.newaxis, :]
+        y = np.asarray(y)[:, np.newaxis]
+
+        s = self.survival(x, t)
+        g = self.growth(x, y, t)
+
+        if self.fecundity_type == 'population' or not include_low_rank:
+            f = 0.0
+        else:
+            f = self.fecundity(x, y, t)
+
+        return s*g + f
+
+
+    def band(self, x, t, tol, include_low_rank=True, **kwargs):
+
+        m = self.growth_mean(np.asarray(x), t)
+        lo, hi = self.normal_band(m, sqrt(1.79), tol)
+
+        if not include_low_rank:
+            return lo, hi
+
+        if self.fecundity_type in [ 'uniform_exp', 'uniform_noexp' ]:
+            lo, hi = np.minimum(lo, -1.5), np.maximum(hi, -1.1)
+        elif self.fecundity_type == 'exp':
+            lo, hi = -np.inf, np.inf
+
+        return lo, hi
+
+
     def population_fecundity(self, n0):
 
         recpptApr     = self.covariat('recpptApr')
@@ -2,14 +2,23 @@
 
 import numpy as np
 
+from utils.eigen import dominant_eigenpair
+
 
 class Kernel(object):
 
+    # attributes that determine the projection matrix (see utils.cache),
+    # kernels that don't list them are never cached
+    cache_parameters = None
+
 
     def __init__(self):
         self.count = 0
         self.method = None
         self.time_dependent = False
+        self.cache = None
+        self._eigenvector = None
+        self._left_eigenvector = None
 
 
     def reset_count(self):
@@ -24,6 +33,21 @@ class Kernel(object):
         self.count += len(x) + len(y)
 
 
+    def increment_count_matrix(self, x, y):
+        # same count as evaluating the kernel one target point at a time
+        self.count += np.size(y) * (np.size(x) + 1)
+
+
+    def normal_band(self, mu, sd, tol):
+        """Return the interval outside of which the normal density with
+        mean *mu* and standard deviation *sd* is below *tol* times its
+        peak."""
+
+        z = np.sqrt(-2.0 * np.log(tol))
+
+        return mu - z * sd, mu + z * sd
+
+
     def setup(self, method, N, **kwargs):
         if hasattr(self, 'discontinuities'):
             method.discontinuities = self.discontinuities
@@ -32,33 +56,135 @@ class Kernel(object):
         self.x = self.method.x
 
 
+    def sample(self, t):
+        """Sample the kernel with the method.
+
+        If a cache is set (see utils.cache), the matrices of time
+        independent kernels are loaded from the cache instead of being
+        assembled, and newly assembled matrices are stored in it.
+        """
+
+        cache = getattr(self, 'cache', None)
+
+        if cache is None or self.time_dependent:
+            self.method.sample(self, t)
+        elif not cache.load(self, self.method):
+            self.method.sample(self, t)
+            cache.store(self, self.method)
+
+
     def update(self, t, **kwargs):
         if self.time_dependent or self.method.A is None:
-            self.method.sample(self, t)
+            self.sample(t)
 
     
-    def first_projection(self):
+    def first_projection(self, bins=None):
         if callable(self.n0):
             n0 = self.n0
         else:
-            n0 = self.empirical_distribution(self.n0)
+            n0 = self.empirical_distribution(self.n0, bins)
         return self.method.eval_or_integrate(n0)
 
 
-    def empirical_distribution(self, measurements):
-        k = self.kernel
-        f = lambda y: sum(map(lambda x: k(x, y, 0), measurements))
+    def empirical_distribution(self, measurements, bins=None):
+        """Return the function n(y) = sum_m k(x_m, y, 0) over all measurements.
+
+        Kernels that provide a *kernel_matrix* method are evaluated
+        against all measurements at once, in blocks of measurements
+        bounded by the method's *block_bytes*.
+
+        If *bins* is given, the measurements are first binned onto a
+        uniform grid of *bins* nodes spanning their range (each
+        measurement is split between its two nearest nodes, linearly),
+        and the kernel is only evaluated at the nodes.  For kernels
+        that are smooth in x the error is O(h^2) in the node spacing h.
+        """
+
+        if not hasattr(self, 'kernel_matrix'):
+            k = self.kernel
+            f = lambda y: sum(map(lambda x: k(x, y, 0), measurements))
+            return f
+
+        x = np.asarray(measurements, dtype=float).ravel()
+        w = np.ones(len(x))
+
+        if bins and len(x) > bins:
+            x, w = self.linear_binning(x, bins)
+
+        def f(y):
+            y = np.asarray(y, dtype=float)
+            n = np.zeros(y.size)
+            for b in self.method.blocks(len(x), y.size):
+                n += np.dot(self.kernel_matrix(x[b], y.ravel(), 0), w[b])
+            return n.reshape(y.shape)
+
         return f
 
 
+    def linear_binning(self, x, bins):
+        """Bin the points *x* onto *bins* uniformly spaced nodes.
+
+        Returns the nodes and their weights.
+        """
+
+        nodes = np.linspace(x.min(), x.max(), bins)
+        h = nodes[1] - nodes[0]
+
+        if h == 0:
+            return nodes[:1], np.array([ float(len(x)) ])
+
+        u = (x - nodes[0]) / h
+        i = np.minimum(np.floor(u).astype(int), bins - 2)
+        u = u - i
+
+        w = (np.bincount(i, 1.0 - u, minlength=bins)
+             + np.bincount(i + 1, u, minlength=bins))
+
+        return nodes, w
+
+
     def project(self, n0):
-        return np.dot(self.method.A, n0)
+        return self.method.dot(n0)
+
+
+    def rproject(self, n0):
+        """Apply the transposed projection operator to *n0*."""
+        return self.method.rdot(n0)
 
 
     def population(self, n0):
         return np.dot(self.method.P, n0)
 
 
+    def stack(self, ns):
+        """Return the population vectors *ns* as the columns of an array.
+
+        *ns* is either a sequence of vectors, or an array whose columns
+        are the vectors.
+        """
+
+        if isinstance(ns, np.ndarray) and ns.ndim == 2:
+            return ns
+        return np.column_stack([ np.asarray(n, dtype=float) for n in ns ])
+
+
+    def project_many(self, ns):
+        """Project many population vectors at once.
+
+        The vectors are stacked as the columns of an array (see
+        *stack*) and projected with one matrix-matrix product.  Returns
+        the projections as the columns of an array.
+        """
+
+        return self.project(self.stack(ns))
+
+
+    def population_many(self, ns):
+        """Return the populations of many population vectors (columns)."""
+
+        return self.population(self.stack(ns))
+
+
     def growth_rate(self, n1, n2):
         """Compute the growth rate between *n1* and *n2*."""
 
@@ -68,6 +194,53 @@ class Kernel(object):
         return p2 / p1
 
 
+    def asymptotic_growth_rate(self, tol=1e-12, maxiter=100):
+        """Return the dominant eigenvalue of the projection operator."""
+
+        return self.eigenpair(tol, maxiter)[0]
+
+
+    def eigenpair(self, tol=1e-12, maxiter=100, left=False):
+        """Return the dominant eigenvalue and the right (or left)
+        eigenvector of the projection operator.
+
+        The eigenvector is kept and used to warm start the next call,
+        after interpolating it onto the current mesh (see
+        utils.eigen).
+        """
+
+        name = '_left_eigenvector' if left else '_eigenvector'
+
+        v0 = getattr(self, name, None)
+        if v0 is not None:
+            x0, v0 = v0
+            v0 = np.interp(self.x, x0, v0)
+
+        matvec = self.rproject if left else self.project
+        gr, v = dominant_eigenpair(matvec, len(self.x), v0, tol, maxiter)
+        setattr(self, name, (np.array(self.x), v))
+
+        return gr, v
+
+
     @property
     def projection_matrix(self):
-        return self.method.A
+        """The projection matrix (dense, sparse or structured).
+
+        Methods that re-use their matrices (eg, MidPoint with
+        *reuse_band* set) overwrite it in place on the next update, so
+        copy it to keep it.
+        """
+
+        A = self.method.A
+        if self.method.F is not None:
+            # sparse and structured (eg, Toeplitz) matrices are made dense
+            if hasattr(A, 'toarray'):
+                A = A.toarray()
+            return A + np.dot(self.method.F, self.method.R.T)
+        return A
+
+
+    @property
+    def projection_operator(self):
+        return self.method.operator
@@ -1,12 +1,15 @@
 """Easterling, Ellner and Dixon IPM kernel."""
 
-from numpy import sqrt, exp
+from numpy import sqrt, exp, asarray, newaxis, minimum, maximum
 from utils.stats import dnorm
 from base import Kernel
 
 
 class EED(Kernel):
 
+    cache_parameters = ( 'L', 'U', 'survival_params', 'growth_params',
+                         'fecundity_params', 'discontinuities' )
+
     def __init__(self, growth_type='orig'):
 
         Kernel.__init__(self)
@@ -55,12 +58,19 @@ class EED(Kernel):
 
     def fecundity(self, x, y, t):
 
+        [ (f1, f2) ] = self.low_rank_terms(x, y, t)
+
+        return f1 * f2
+
+
+    def low_rank_terms(self, x, y, t):
+
         a0, a1 = self.fecundity_params
 
-        f1 = a0 + a1 * x
+        f1 = a0 + a1 * asarray(x)
         f2 = 1.0 * (0.15 <= y) * (y <= 0.25) / (0.25 - 0.15)
 
-        return f1 * f2
+        return [ (f1, f2) ]
 
 
     def kernel(self, x, y, t, **kwargs):
@@ -74,6 +84,38 @@ class EED(Kernel):
         return s*g + f
 
 
+    def kernel_matrix(self, x, y, t, include_low_rank=True, **kwargs):
+
+        self.increment_count_matrix(x, y)
+
+        x = asarray(x)[newaxis, :]
+        y = asarray(y)[:, newaxis]
+
+        s = self.survival(x, t)
+        g = self.growth(x, y, t)
+
+        if not include_low_rank:
+            return s*g
+
+        f = self.fecundity(x, y, t)
+
+        return s*g + f
+
+
+    def band(self, x, t, tol, include_low_rank=True, **kwargs):
+
+        a0, a1, b0, b1 = self.growth_params
+
+        x = asarray(x)
+        lo, hi = self.normal_band(a0 + a1 * x, sqrt(b0 + b1 * x), tol)
+
+        if not include_low_rank:
+            return lo, hi
+
+        # the fecundity part is supported on [0.15, 0.25]
+        return minimum(lo, 0.15), maximum(hi, 0.25)
+
+
     #### y-integrable form
 
     def s(self, x, t):
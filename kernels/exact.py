@@ -1,6 +1,6 @@
 """Exact kernel (test kernel with a known solution)."""
 
-from numpy import sqrt, exp
+from numpy import sqrt, exp, asarray, newaxis
 from scipy.integrate import quad
 from utils.stats import dnorm, pnorm
 from base import Kernel
@@ -8,6 +8,8 @@ from base import Kernel
 
 class Exact(Kernel):
 
+    cache_parameters = ( 'L', 'U', '_ss', '_mu', '_theta' )
+
     def __init__(self, **kwargs):
 
         self.L = 0.0
@@ -39,6 +41,29 @@ class Exact(Kernel):
         return exp(-self._theta * x**2) * dnorm(y, mu=x+self._mu, sd=sqrt(self._ss))
 
 
+    def kernel_matrix(self, x, y, t, **kwargs):
+
+        self.increment_count_matrix(x, y)
+
+        x = asarray(x)[newaxis, :]
+        y = asarray(y)[:, newaxis]
+
+        return exp(-self._theta * x**2) * dnorm(y, mu=x+self._mu, sd=sqrt(self._ss))
+
+
+    def convolution(self, t):
+
+        s = lambda x: exp(-self._theta * x**2)
+        g = lambda d: dnorm(d, mu=self._mu, sd=sqrt(self._ss))
+
+        return s, g
+
+
+    def band(self, x, t, tol, **kwargs):
+
+        return self.normal_band(asarray(x) + self._mu, sqrt(self._ss), tol)
+
+
     #### y-integrable form
 
     def s(self, x, t):
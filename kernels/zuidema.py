@@ -1,12 +1,68 @@
 """Zuidema Parashorea Chinensis kernel."""
 
-from numpy import sqrt, exp, dot, zeros, asarray
+import numpy as np
+
+from numpy import sqrt, exp, dot, zeros, asarray, newaxis
+from scipy.sparse import issparse, bmat
 from utils.stats import dnorm, dtnorm
 from base import Kernel
 
 
+class StageOperator(object):
+    """Projection operator with the four discrete stages in front of a
+    continuous operator *C* (eg, a matrix free operator).
+
+    The discrete parts are the dense blocks *ss*, *st* and *ts*.
+    """
+
+    def __init__(self, ss, st, ts, C):
+
+        self.ss = ss
+        self.st = st
+        self.ts = ts
+        self.C  = C
+
+        n = 4 + C.shape[0]
+        self.shape = (n, n)
+        self.dtype = np.dtype(float)
+
+
+    def dot(self, n):
+        """Return the product of the operator with *n* (a vector, or columns)."""
+
+        n = np.asarray(n, dtype=float)
+
+        r = np.empty(n.shape)
+        r[:4] = self.ss.dot(n[:4]) + self.st.dot(n[4:])
+        r[4:] = self.ts.dot(n[:4]) + self.C.dot(n[4:])
+
+        return r
+
+
+    @property
+    def T(self):
+        return StageOperator(self.ss.T, self.ts.T, self.st.T, self.C.T)
+
+
+    def toarray(self):
+        """Return the operator as a dense array."""
+
+        C = self.C.toarray()
+
+        A = zeros(self.shape, dtype=C.dtype)
+        A[:4, :4] = self.ss
+        A[:4, 4:] = self.st
+        A[4:, :4] = self.ts
+        A[4:, 4:] = C
+
+        return A
+
+
 class Zuidema(Kernel):
 
+    cache_parameters = ( 'L', 'U', 'survival_params', 'growth_params',
+                         'k_st_params', 'k_ts_params', 'k_ss' )
+
 
     def __init__(self, **kwargs):
 
@@ -64,6 +120,29 @@ class Zuidema(Kernel):
         return s*g
 
 
+    def kernel_matrix(self, x, y, t, **kwargs):
+
+        self.increment_count_matrix(x, y)
+
+        x = asarray(x)[newaxis, :]
+        y = asarray(y)[:, newaxis]
+
+        s = self.survival(x, t)
+        g = self.growth(x, y, t)
+
+        return s*g
+
+
+    def band(self, x, t, tol, **kwargs):
+
+        a, b, c, sd = self.growth_params
+
+        x = asarray(x)
+        m = b * c * x**(c-1.0) / ( b + x**c/a )**2
+
+        return self.normal_band(x + m, sd, tol)
+
+
     #### discrete parts
 
     def k_st(self, x):
@@ -93,10 +172,10 @@ class Zuidema(Kernel):
         return A
 
 
-    def setup(self, method, N):
+    def setup(self, method, N, **kwargs):
 
         self.method = method
-        self.method.setup(self.L, self.U, N)
+        self.method.setup(self.L, self.U, N, **kwargs)
         self.N = len(self.method.x)
 
         N = self.N
@@ -104,9 +183,21 @@ class Zuidema(Kernel):
         self.x[4:] = self.method.x
         self.x[:4] = asarray([ -4, -3, -2, -1 ])
 
-        self.method.sample(self, 0) # sample continuous part of myself
+        self.sample(0) # sample continuous part of myself
+
+        if not isinstance(self.method.A, np.ndarray) and not issparse(self.method.A):
+            # structured operators (eg, matrix free) are applied as is
+            self.A = StageOperator(self.k_ss, self.k_st(self.method.x),
+                                   self.k_ts(self.method.x), self.method.A)
+            return
+
+        if issparse(self.method.A):
+            self.A = bmat([[ self.k_ss,               self.k_st(self.method.x) ],
+                           [ self.k_ts(self.method.x), self.method.A            ]],
+                          format='csr').astype(self.method.A.dtype)
+            return
 
-        self.A = zeros((N+4, N+4))
+        self.A = zeros((N+4, N+4), dtype=self.method.A.dtype)
         self.A[:4, :4] = self.k_ss
         self.A[:4, 4:] = self.k_st(self.method.x)
         self.A[4:, :4] = self.k_ts(self.method.x)
@@ -118,14 +209,14 @@ class Zuidema(Kernel):
         return sum(n[:4]) + dot(self.method.P, n[4:])
 
 
-    def first_projection(self):
+    def first_projection(self, bins=None):
 
         n1 = zeros(4+self.N)
 
         if callable(self.n0):
             n0 = self.n0
         else:
-            n0 = self.empirical_distribution(self.n0)
+            n0 = self.empirical_distribution(self.n0, bins)
 
         n1[4:] = self.method.eval_or_integrate(n0)
 
@@ -133,7 +224,11 @@ class Zuidema(Kernel):
 
 
     def project(self, n0):
-        return dot(self.A, n0)
+        return self.method.apply(self.A, n0)
+
+
+    def rproject(self, n0):
+        return self.method.apply(self.A.T, n0)
 
 
     @property
@@ -3,20 +3,293 @@
 import logging
 
 import numpy as np
+import scipy.sparse
+
+from matrixfree import KernelOperator
 
 class Method(object):
 
-    def eval_or_integrate(self, f):
-        """Evaluate *f* at mesh points, or integrate *f* over mesh cells."""
+    # upper bound (in bytes) on the size of kernel blocks evaluated at once
+    block_bytes = 2**26
+
+    # number of source points per block when assembling sparse matrices
+    sparse_block = 64
+    sparse_tol = None
+
+    # sparse matrices with a larger fraction of significant entries are
+    # stored dense (they would be larger and slower to apply)
+    sparse_fill = 0.25
+
+    toeplitz = False
+    shift = False
+    matrix_free = False
+
+    # methods that assemble their matrices with *assemble* can be matrix free
+    supports_matrix_free = False
+
+    # storage precision of the projection matrix ('double' or 'single')
+    precision = 'double'
+
+    # low rank terms of the projection matrix: A + dot(F, R.T)
+    low_rank = False
+    F = None
+    R = None
+
+    # attributes that determine the projection matrix (see utils.cache)
+    cache_parameters = ( 'name', 'mesh_type', 'L', 'U', 'N', 'sparse_tol',
+                         'low_rank', 'toeplitz', 'shift', 'matrix_free',
+                         'precision' )
+
+
+    @property
+    def A(self):
+        return getattr(self, '_A', None)
+
+    @A.setter
+    def A(self, A):
+        # matrices are stored in the storage precision
+        if self.precision == 'single' and hasattr(A, 'astype') and A.dtype != np.float32:
+            A = A.astype(np.float32)
+        self._A = A
+
+
+    def blocks(self, n, m, step=None):
+        """Split range(n) into slices of items that hold *m* floats each.
+
+        Each slice is sized so that it holds at most *block_bytes*,
+        and at most *step* items if given.
+        """
+
+        step = min(step or n or 1, max(1, int(self.block_bytes / (8 * m))))
+        for start in xrange(0, n, step):
+            yield slice(start, min(start + step, n))
+
+
+    def significant(self, A):
+        """Return the (row, column) indices of the significant entries of *A*.
+
+        Entries are significant if they are larger (in magnitude) than
+        *sparse_tol* times the largest entry of their column.
+        """
+
+        A = abs(A)
+        return np.nonzero(A > self.sparse_tol * A.max(axis=0))
+
+
+    def truncate(self, A):
+        """Return the sparse (CSR) matrix of the significant entries of *A*
+        (see *compact*)."""
+
+        i, j = self.significant(A)
+
+        return self.compact(
+            scipy.sparse.csr_matrix((A[i, j], (i, j)), shape=A.shape))
+
+
+    def compact(self, S):
+        """Return the sparse matrix *S*, or its dense form if more than
+        *sparse_fill* of its entries are stored."""
+
+        if S.nnz > self.sparse_fill * S.shape[0] * S.shape[1]:
+            logging.debug("METHOD: fill %.2f, storing dense",
+                          S.nnz / float(S.shape[0] * S.shape[1]))
+            return S.toarray()
+
+        return S
+
+
+    def assemble(self, kernel, x, y, t, weights, ix=None, **kwargs):
+        """Return the matrix of weighted kernel values w[j] k(x[j], y[i], t).
+
+        The kernel is evaluated in blocks of source points (columns)
+        so that the temporaries are bounded by *block_bytes*.
+
+        If *sparse_tol* is set, a sparse (CSR) matrix of the
+        significant entries is returned instead.  Kernels that provide
+        a *band* method are only evaluated within the band of targets
+        that can receive significant entries.
+
+        If *low_rank* is set and the kernel provides *low_rank_terms*,
+        the low rank terms are left out of the returned matrix and are
+        stored as the factors *F* and *R* instead.
+
+        If *matrix_free* is set, a KernelOperator that evaluates the
+        kernel on the fly is returned instead (see methods.matrixfree).
+        """
+
+        self.F = self.R = None
+        if self.factored(kernel):
+            kwargs['include_low_rank'] = False
+            self.F, self.R = self.low_rank_factors(kernel, x, y, t, weights)
+
+        if self.matrix_free:
+            return KernelOperator(self, kernel, x, y, t, weights, ix, kwargs)
+
+        if self.sparse_tol:
+            return self.assemble_sparse(kernel, x, y, t, weights, ix=ix, **kwargs)
+
+        A = np.empty((len(y), len(x)),
+                     dtype=np.float32 if self.precision == 'single' else float)
+        for cols in self.blocks(len(x), len(y)):
+            if ix is not None:
+                kwargs['ix'] = ix[cols]
+            A[:, cols] = self.kernel_matrix(kernel, x[cols], y, t, **kwargs)
+            A[:, cols] *= weights[cols]
+
+        return A
+
+
+    def assemble_sparse(self, kernel, x, y, t, weights, ix=None, **kwargs):
+        """Return the sparse (CSR) matrix of weighted kernel values (see
+        *compact*).
+
+        The target points *y* must be sorted.
+        """
+
+        band = getattr(kernel, 'band', None)
+
+        rows, cols, vals = [], [], []
+        for c in self.blocks(len(x), len(y), self.sparse_block):
+            if ix is not None:
+                kwargs['ix'] = ix[c]
+
+            if band is not None:
+                lo, hi = band(x[c], t, self.sparse_tol, **kwargs)
+                r = slice(np.searchsorted(y, np.min(lo)),
+                          np.searchsorted(y, np.max(hi), 'right'))
+            else:
+                r = slice(0, len(y))
+
+            if r.stop <= r.start:
+                continue
+
+            K = self.kernel_matrix(kernel, x[c], y[r], t, **kwargs) * weights[c]
+            i, j = self.significant(K)
+
+            rows.append(i + r.start)
+            cols.append(j + c.start)
+            vals.append(K[i, j])
+
+        if not vals:
+            return scipy.sparse.csr_matrix((len(y), len(x)))
+
+        return self.compact(scipy.sparse.csr_matrix(
+            (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(y), len(x))))
+
+
+    def factored(self, kernel):
+        """Return True if the low rank terms of *kernel* are stored as factors.
+
+        Kernels with low rank terms provide *low_rank_terms(x, y, t)*,
+        which returns a list of (r(x), F(y)) pairs, and leave these
+        terms out of *kernel_matrix* if called with include_low_rank=False.
+        """
+
+        return self.low_rank and hasattr(kernel, 'low_rank_terms')
+
+
+    def low_rank_factors(self, kernel, x, y, t, weights):
+        """Return the factors F and R of the low rank terms of *kernel*.
+
+        The weighted low rank terms w[j] r(x[j]) F(y[i]) are the
+        entries of dot(F, R.T).  Returns (None, None) if there are no
+        low rank terms.
+        """
+
+        terms = kernel.low_rank_terms(x, y, t)
+        if not terms:
+            return None, None
+
+        F = np.column_stack([ f * np.ones(len(y)) for _, f in terms ])
+        R = np.column_stack([ weights * r * np.ones(len(x)) for r, _ in terms ])
+
+        return F, R
+
+
+    def apply(self, A, n):
+        """Return the product of *A* with *n*.
+
+        Single precision matrices are applied to a single precision
+        copy of *n*, and the product is returned in double precision.
+        """
+
+        if getattr(A, 'dtype', None) == np.float32:
+            return A.dot(np.asarray(n, dtype=np.float32)).astype(float)
+
+        return A.dot(n)
+
+
+    def dot(self, n):
+        """Apply the projection matrix (including low rank terms) to *n*."""
+
+        r = self.apply(self.A, n)
+        if self.F is not None:
+            r = r + self.F.dot(self.R.T.dot(n))
+
+        return r
+
+
+    def rdot(self, n):
+        """Apply the transposed projection matrix to *n*."""
+
+        r = self.apply(self.A.T, n)
+        if self.F is not None:
+            r = r + self.R.dot(self.F.T.dot(n))
+
+        return r
+
+
+    @property
+    def operator(self):
+        """The projection matrix as a scipy LinearOperator."""
+
+        from scipy.sparse.linalg import LinearOperator
+
+        return LinearOperator(self.A.shape, matvec=self.dot, rmatvec=self.rdot,
+                              matmat=self.dot, dtype=float)
+
+
+    def kernel_matrix(self, kernel, x, y, t, **kwargs):
+        """Return the matrix of kernel values k(x[j], y[i], t).
+
+        Row *i* corresponds to the target point y[i] and column *j* to
+        the source point x[j].  Kernels that provide a *kernel_matrix*
+        method are evaluated in one broadcast call, otherwise the
+        kernel is evaluated one row at a time.
+        """
+
+        if hasattr(kernel, 'kernel_matrix'):
+            return kernel.kernel_matrix(x, y, t, **kwargs)
+
+        A = np.empty((len(y), len(x)))
+        for i in xrange(len(y)):
+            A[i, :] = kernel.kernel(x, y[i], t, iy=i, **kwargs)
+
+        return A
+
+
+    def eval_or_integrate(self, f, k=5):
+        """Evaluate *f* at mesh points, or integrate *f* over mesh cells.
+
+        Cells are integrated with the *k* point Gauss-Legendre rule,
+        and *f* is evaluated once at the quadrature points of all
+        cells.
+        """
 
         if self.mesh_type == 'cell':
 
-            import scipy.integrate
-            n = np.zeros(self.N)
-            for i in range(self.N):
-                # n[i], _ = scipy.integrate.quad(f, self.X[i], self.X[i+1])
-                n[i], _ = scipy.integrate.fixed_quad(f, self.X[i], self.X[i+1])
-                n[i] /= self.dx
+            from scipy.special.orthogonal import p_roots
+            xi, w = p_roots(k)
+
+            X  = self.X
+            h2 = 0.5 * (X[1:] - X[:-1])
+            xq = 0.5 * (X[1:] + X[:-1])[:, np.newaxis] + h2[:, np.newaxis] * xi.real
+
+            fq = np.zeros(xq.size)
+            fq[...] = f(xq.ravel())
+
+            n = h2 * np.dot(fq.reshape(xq.shape), w) / self.dx
 
         else:
 
@@ -54,13 +327,60 @@ class Method(object):
         return p2 / p1
 
 
-    def setup(self, L, U, N, *args, **kwargs):
+    def setup(self, L, U, N, sparse_tol=None, low_rank=False, toeplitz=False,
+              shift=False, matrix_free=False, precision='double', **kwargs):
+        """Set up the mesh on [L, U] with N cells or points.
+
+        If *sparse_tol* is given, the projection matrix is stored as a
+        sparse matrix of the entries that are larger than *sparse_tol*
+        times the largest entry of their column.  This only pays off
+        for narrow kernels (eg, ABB): if more than *sparse_fill* of the
+        entries are significant, the (truncated) matrix is stored dense.
+
+        If *low_rank* is True, the low rank terms of kernels (eg,
+        separable fecundity terms) are stored as factors F and R
+        outside of the projection matrix.
+
+        If *toeplitz* is True, methods that support it (MidPoint)
+        store translation invariant kernels as Toeplitz matrices that
+        are applied with FFTs (see methods.toeplitz).
+
+        If *shift* is True, methods that support it (MidPoint) store
+        kernels whose growth only shifts from year to year as a base
+        stencil and a shift (see methods.shift).
+
+        If *matrix_free* is True, methods that assemble their matrices
+        with *assemble* (MidPoint, GaussQuad) do not store them, and
+        evaluate the kernel in blocks of *block_bytes* every time they
+        are applied instead (see methods.matrixfree).  Other methods
+        raise a ValueError.
+
+        If *precision* is 'single', projection matrices are stored in
+        single precision (halving their size and the time to apply
+        them), while populations and iterates stay in double
+        precision.  Structured operators (Toeplitz, shifted stencils
+        and matrix-free operators) are always double precision.
+        """
+
+        if precision not in [ 'double', 'single' ]:
+            raise ValueError("invalid precision, should be 'double' or 'single'")
+
+        if matrix_free and not self.supports_matrix_free:
+            raise ValueError("%s doesn't support matrix_free" % self.name)
 
         self.L = L
         self.U = U
         self.N = N
         self.A = None
         self.P = None
+        self.F = None
+        self.R = None
+        self.sparse_tol = sparse_tol
+        self.low_rank = low_rank
+        self.toeplitz = toeplitz
+        self.shift = shift
+        self.matrix_free = matrix_free
+        self.precision = precision
 
         if self.mesh_type == 'cell':
             dx = (U - L) / N
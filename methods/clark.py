@@ -31,6 +31,8 @@ class INTClark(base.Method):
 
     mesh_type = 'cell'
 
+    cache_parameters = base.Method.cache_parameters + ( 'k', )
+
     def __init__(self, k=None):
 
         if k:
@@ -42,6 +44,10 @@ class INTClark(base.Method):
         self.name = name
         # self.fixed_quad = fquad
 
+        if k:
+            from scipy.special.orthogonal import p_roots
+            self.xi, self.w = p_roots(k)
+
 
     def sample(self, kernel, t):
 
@@ -50,6 +56,15 @@ class INTClark(base.Method):
         L = self.L
         X = self.X
 
+        self.F = self.R = None
+
+        if self.k:
+            self.A = self.sample_gauss(kernel, t)
+            if self.sparse_tol:
+                self.A = self.truncate(self.A)
+            logging.debug("%s: update: kernel sampled", self.name)
+            return
+
         A = np.zeros((N, N))
         for i in range(N):
             logging.debug('%s: sampling (%d): %d', self.name, N, i)
@@ -78,10 +93,70 @@ class INTClark(base.Method):
                 A[j, i] = v / dx
 
         self.A = A 
+        if self.sparse_tol:
+            self.A = self.truncate(A)
 
         logging.debug("%s: update: kernel sampled", self.name)
 
 
+    def sample_gauss(self, kernel, t):
+        """Sample the kernel using CDF differences over all cell edges.
+
+        The survival, growth mean, growth standard deviation and
+        fecundity rate are evaluated once at the Gauss points of every
+        source cell.  The growth mass that lands in each target cell is
+        the difference of the normal CDF at consecutive cell edges.
+        """
+
+        N = self.N
+        X = self.X
+        k = self.k
+        w = self.w
+
+        dx = (self.U - self.L) / N
+
+        # gauss points of all source cells, cell by cell
+        xq = (0.5*(X[1:] + X[:-1])[:, np.newaxis]
+              + 0.5*(X[1:] - X[:-1])[:, np.newaxis] * self.xi).ravel()
+
+        # cell integrals of the fecundity distribution
+        F = np.asarray([ kernel.F(X[j], X[j+1], t) for j in range(N) ])
+
+        count = getattr(kernel, 'count', None)
+
+        one = np.ones(N*k)
+        s  = kernel.s(xq, t) * one
+        r  = kernel.r(xq, t) * one
+        mu = kernel.mu(xq, t) * one
+        sd = kernel.sd(xq, t) * one
+
+        # count as evaluating the kernel at the gauss points of every
+        # source cell once per target cell
+        if count is not None:
+            kernel.count = count + N * (kernel.count - count)
+
+        # quadrature weights of each source cell, scaled by 1/dx
+        W = 0.5 * (X[1:] - X[:-1])[:, np.newaxis] * w / dx
+
+        A = np.empty((N, N))
+        for cells in self.blocks(N, k * (N+1)):
+            q  = slice(cells.start*k, cells.stop*k)
+            nb = cells.stop - cells.start
+
+            p = pnorm(X[np.newaxis, :], mu[q, np.newaxis], sd[q, np.newaxis])
+            p = s[q, np.newaxis] * np.diff(p, axis=1)
+
+            A[:, cells] = np.einsum('imj,im->ji', p.reshape((nb, k, N)), W[cells])
+
+        R = np.sum(W * r.reshape((N, k)), axis=1)
+        if self.low_rank:
+            self.F, self.R = F[:, np.newaxis], R[:, np.newaxis]
+        else:
+            A += np.outer(F, R)
+
+        return A
+
+
 ###############################################################################
 
 class GENClark(base.Method):
@@ -89,6 +164,8 @@ class GENClark(base.Method):
 
     mesh_type = 'cell'
 
+    cache_parameters = base.Method.cache_parameters + ( 'k', )
+
 
     def __init__(self, k=None, qtype='GaussLegendre'):
 
@@ -117,31 +194,78 @@ class GENClark(base.Method):
         X = self.X
 
         h = (U - L) / N
-        s = 0.5 * h
+
+        self.F = self.R = None
+
+        if self.k:
+            self.A = self.sample_gauss(kernel, t)
+            if self.sparse_tol:
+                self.A = self.truncate(self.A)
+            logging.debug("%s: update: kernel sampled", self.name)
+            return
+
         A = np.zeros((N, N))
         for i in range(N):
             logging.debug('%s: sampling (%d): %d', self.name, N, i)
 
-            if self.k:
-                xp = 0.5*(X[i+1] + X[i]) + 0.5*(X[i+1] - X[i]) * self.xi
+            for j in range(N):
 
+                dxdy = lambda x, y: kernel.kernel(x, y, t)
+                v, _ = scipy.integrate.dblquad(dxdy, X[j], X[j+1], 
+                                               lambda x: X[i], lambda x: X[i+1])
+                A[j, i] = v / h
 
-            for j in range(N):
+        self.A = A 
+        if self.sparse_tol:
+            self.A = self.truncate(A)
 
-                if self.k:
-                    yp = 0.5*(X[j+1] + X[j]) + 0.5*(X[j+1] - X[j]) * self.xi
+        logging.debug("%s: update: kernel sampled", self.name)
 
-                    v = 0.0
-                    for m, x in enumerate(xp):
-                        v += s**2 * self.w[m] * np.dot(self.w, kernel.kernel(x, yp, t))
 
-                else:
+    def sample_gauss(self, kernel, t):
+        """Sample the kernel on the tensor grid of Gauss points.
 
-                    dxdy = lambda x, y: kernel.kernel(x, y, t)
-                    v, _ = scipy.integrate.dblquad(dxdy, X[j], X[j+1], 
-                                                   lambda x: X[i], lambda x: X[i+1])
-                A[j, i] = v / h
+        The kernel is evaluated on the (N k) x (N k) grid of Gauss
+        points, in blocks of source cells, and each k x k block is
+        reduced with the tensor product of the quadrature weights.
+        """
 
-        self.A = A 
+        N = self.N
+        X = self.X
+        k = self.k
+        w = self.w
 
-        logging.debug("%s: update: kernel sampled", self.name)
+        h = (self.U - self.L) / N
+        s = 0.5 * h
+
+        # gauss points of all cells, cell by cell
+        xg = (0.5*(X[1:] + X[:-1])[:, np.newaxis]
+              + 0.5*(X[1:] - X[:-1])[:, np.newaxis] * self.xi).ravel()
+
+        kwargs = {}
+        if self.factored(kernel):
+            kwargs['include_low_rank'] = False
+            terms = kernel.low_rank_terms(xg, xg, t)
+            if terms:
+                one = np.ones(N*k)
+                self.F = np.column_stack(
+                    [ s * np.dot((f * one).reshape((N, k)), w) for _, f in terms ])
+                self.R = np.column_stack(
+                    [ s / h * np.dot((r * one).reshape((N, k)), w) for r, _ in terms ])
+
+        count = getattr(kernel, 'count', None)
+
+        A = np.empty((N, N))
+        for cells in self.blocks(N, k * N * k):
+            nb = cells.stop - cells.start
+            K  = self.kernel_matrix(kernel, xg[cells.start*k:cells.stop*k], xg, t,
+                                    **kwargs)
+            K  = K.reshape((N, k, nb, k))
+            A[:, cells] = np.einsum('jlim,l,m->ji', K, w, w)
+
+        # count as evaluating the kernel one pair of cells at a time (at
+        # each source gauss point and all target gauss points)
+        if count is not None:
+            kernel.count = count + N * N * k * (k + 1)
+
+        return s**2 / h * A
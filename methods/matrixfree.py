@@ -0,0 +1,98 @@
+"""Matrix-free projection operators.
+
+Instead of storing the projection matrix, the kernel is evaluated on
+the fly, in blocks of rows (or columns, for the transpose) that are
+bounded by the method's *block_bytes*, every time the operator is
+applied.  This trades recomputation for memory on meshes that are too
+large to store.
+
+The operator keeps a (shallow) copy of the kernel, so that it is
+evaluated with the kernel state (eg, its covariates and parameters) at
+the time it was sampled, just like a stored matrix.
+
+"""
+
+import copy
+
+import numpy as np
+
+
+class KernelOperator(object):
+    """Matrix of weighted kernel values w[j] k(x[j], y[i], t).
+
+    The blocks are evaluated with *method* (see Method.kernel_matrix),
+    with the extra keyword arguments *kwargs*.  If *ix* is given, it
+    holds the mesh indices of the source points.  If *transposed* is
+    True, the operator is the transpose.
+    """
+
+    def __init__(self, method, kernel, x, y, t, weights, ix=None, kwargs={},
+                 transposed=False):
+
+        self.method = method
+        self.kernel = kernel
+        self.state  = copy.copy(kernel)
+        self.x = x
+        self.y = y
+        self.t = t
+        self.weights = weights
+        self.ix = ix
+        self.kwargs = kwargs
+        self.transposed = transposed
+
+        self.shape = (len(y), len(x)) if not transposed else (len(x), len(y))
+        self.dtype = np.dtype(float)
+
+
+    def block(self, rows=slice(None), cols=slice(None)):
+        """Return the block A[rows, cols] (of the untransposed matrix)."""
+
+        kwargs = dict(self.kwargs)
+        if self.ix is not None:
+            kwargs['ix'] = self.ix[cols]
+
+        count = getattr(self.state, 'count', 0)
+        K = self.method.kernel_matrix(self.state, self.x[cols], self.y[rows],
+                                      self.t, **kwargs)
+
+        # count the evaluations on the kernel itself
+        if hasattr(self.kernel, 'count'):
+            self.kernel.count += self.state.count - count
+
+        return K * self.weights[cols]
+
+
+    def dot(self, n):
+        """Return the product of the operator with *n* (a vector, or columns)."""
+
+        n = np.asarray(n, dtype=float)
+        nx, ny = len(self.x), len(self.y)
+
+        if self.transposed:
+            # rows of the transpose are columns of the matrix
+            r = np.empty((nx,) + n.shape[1:])
+            for cols in self.method.blocks(nx, ny):
+                r[cols] = self.block(cols=cols).T.dot(n)
+            return r
+
+        r = np.empty((ny,) + n.shape[1:])
+        for rows in self.method.blocks(ny, nx):
+            r[rows] = self.block(rows=rows).dot(n)
+        return r
+
+
+    @property
+    def T(self):
+        T = copy.copy(self)
+        T.transposed = not self.transposed
+        T.shape = self.shape[::-1]
+        return T
+
+
+    def toarray(self):
+        """Return the operator as a dense array."""
+
+        A = self.block()
+        if self.transposed:
+            return A.T
+        return A
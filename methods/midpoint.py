@@ -3,12 +3,25 @@
 import logging
 
 import numpy as np
+import scipy.sparse
 import base
 
+from toeplitz import Toeplitz
+from shift import ShiftedStencil
+
 class MidPoint(base.Method):
 
     name = 'MidPoint'
     mesh_type = 'cell'
+    supports_matrix_free = True
+
+    # padding of shifted stencils, as a fraction of the domain
+    shift_margin = 0.1
+    _stencil = None
+
+    # re-use the dense matrix of the last normal band (overwriting it)
+    reuse_band = False
+    _band = None
 
 
     # def eval_or_integrate(self, f):
@@ -18,19 +31,155 @@ class MidPoint(base.Method):
     def sample(self, kernel, t):
 
         N = self.N
-        U = self.U
-        L = self.L
         x = self.x
 
         logging.debug("MIDPOINT: sampling kernel")
 
-        dx = (U - L) / N
+        if self.toeplitz and hasattr(kernel, 'convolution'):
+            self.A = self.sample_toeplitz(kernel, t)
+            return
+
+        if self.shift and hasattr(kernel, 'shift_decomposition'):
+            self.A = self.sample_shift(kernel, t)
+            return
+
+        if not self.matrix_free and hasattr(kernel, 'normal_growth'):
+            self.A = self.sample_normal(kernel, t)
+            return
+
+        ix = np.arange(N)
+
+        self.A = self.assemble(kernel, x, x, t, self.P, ix=ix)
+
+
+    def sample_toeplitz(self, kernel, t):
+        """Sample a translation invariant kernel as a Toeplitz matrix.
+
+        The kernel provides *convolution(t)*, which returns functions
+        s and g such that (apart from any low rank terms) k(x, y, t) =
+        s(x) g(y - x).  On the uniform mid-point mesh the matrix is
+        T diag(s(x)), where T[i, j] = dx g((i - j) dx).  Low rank
+        terms are always stored as factors.
+        """
+
+        N  = self.N
+        dx = self.dx
+        x  = self.x
+
+        s, g = kernel.convolution(t)
+
+        d = dx * np.arange(N)
+        kernel.increment_count(d, d)
+
+        self.F = self.R = None
+        if hasattr(kernel, 'low_rank_terms'):
+            self.F, self.R = self.low_rank_factors(kernel, x, x, t, self.P)
+
+        return Toeplitz(dx * g(d), dx * g(-d), s(x))
+
+
+
+    def sample_shift(self, kernel, t):
+        """Sample the kernel as a shifted base stencil.
+
+        The kernel provides *shift_decomposition(t)*, which returns s,
+        a, c and g such that (apart from any low rank terms) k(x, y, t)
+        = s(x) g(y - a x - c).  The base stencil dx g(z - a x) is
+        sampled on a padded target mesh and reused for as long as *a*
+        does not change and *c* stays within the padding, so that
+        re-sampling only costs O(N).  Low rank terms are always stored
+        as factors.
+        """
+
+        N  = self.N
+        dx = self.dx
+        x  = self.x
+
+        s, a, c, g = kernel.shift_decomposition(t)
+        key = (a, x[0], dx, N)
+
+        if self._stencil is not None:
+            key0, c0, p, G = self._stencil
+            if key0 != key or abs(c - c0) > (p - 2) * dx:
+                self._stencil = None
+
+        if self._stencil is None:
+            p = int(np.ceil(self.shift_margin * (self.U - self.L) / dx)) + 2
+            z = x[0] - c + dx * (np.arange(N + 2*p) - p)
+            G = dx * g(z[:, np.newaxis] - a * x[np.newaxis, :])
+            kernel.increment_count_matrix(x, z)
+            self._stencil = key, c, p, G
+
+            logging.debug("MIDPOINT: base stencil sampled (%d padding)", p)
+
+        key0, c0, p, G = self._stencil
+
+        self.F = self.R = None
+        if hasattr(kernel, 'low_rank_terms'):
+            self.F, self.R = self.low_rank_factors(kernel, x, x, t, self.P)
+
+        return ShiftedStencil(G, (c - c0) / dx, s(x), p)
+
+
+    def sample_normal(self, kernel, t):
+        """Sample a kernel with normal growth directly.
+
+        The kernel provides *normal_growth(t)*, which returns mu, sd
+        and s at the mesh points such that k(x[j], y, t) = s[j]
+        dnorm(y, mu[j], sd).  Each column is only evaluated within the
+        band of targets where it can be non-zero (or, if *sparse_tol*
+        is set, significant), and the band is written into a dense
+        matrix (or a sparse matrix).
+
+        If *reuse_band* is set, the dense matrix of the previous call
+        is re-used if it is still the projection matrix: only the
+        entries of its band are zeroed, and the matrix is overwritten
+        in place (so matrices kept from earlier calls change too).
+        """
+
+        N = self.N
+        x = self.x
+
+        mu, sd, s = kernel.normal_growth(t)
+        sd = np.broadcast_to(sd, mu.shape)
+
+        # below the smallest positive float (or sparse_tol) times the peak
+        tol = self.sparse_tol or np.finfo(float).tiny * np.finfo(float).eps
+        lo, hi = kernel.normal_band(mu, sd, tol)
+        lo = np.searchsorted(x, lo)
+        hi = np.searchsorted(x, hi, 'right')
+
+        # column and row indices of the band
+        nnz = hi - lo
+        ptr = np.concatenate([ [ 0 ], np.cumsum(nnz) ])
+        j = np.repeat(np.arange(N), nnz)
+        i = lo[j] + np.arange(ptr[-1]) - ptr[j]
+
+        c = 1.0 / sd[j]
+        z = c * (x[i] - mu[j])
+        v = (self.P * s)[j] * c * np.exp(-0.5 * z**2) / np.sqrt(2.0 * np.pi)
+
+        if self.sparse_tol:
+            # keep the significant entries of each column
+            vmax = np.zeros(N)
+            if len(v):
+                vmax[nnz > 0] = np.maximum.reduceat(v, ptr[:-1][nnz > 0])
+            keep = v > self.sparse_tol * vmax[j]
+            return self.compact(scipy.sparse.csr_matrix(
+                (v[keep], (i[keep], j[keep])), shape=(N, N)))
 
-        ix = np.array(range(N))
+        dtype = np.float32 if self.precision == 'single' else float
 
-        A = np.zeros((N, N))
-        for i in xrange(N):
-            A[i, :] = dx * kernel.kernel(x, x[i], t, ix=ix, iy=i)
+        if (self.reuse_band and self._band is not None
+                and self._band[0] is self.A
+                and self.A.shape == (N, N) and self.A.dtype == dtype):
+            A, i0, j0 = self._band
+            A[i0, j0] = 0.0
+        else:
+            A = np.zeros((N, N), dtype=dtype)
 
-        self.A = A
+        A[i, j] = v
+        if self.reuse_band:
+            self._band = A, i, j
 
+        return A
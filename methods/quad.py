@@ -35,6 +35,10 @@ def adjust(x, discontinuities):
 class GaussQuad(base.Method):
 
     mesh_type = 'point'
+    supports_matrix_free = True
+
+    cache_parameters = base.Method.cache_parameters + ( 'k', 'qtype', 'adjust',
+                                                        'discontinuities' )
 
     def __init__(self, qtype='GaussLegendre', k=None, adjust=False):
 
@@ -76,18 +80,13 @@ class GaussQuad(base.Method):
             if self.adjust and jumps:
                 edges = adjust(edges, jumps)
 
-            # compute quad weights and points
-            x = np.zeros(k*N)
-            P = np.zeros(k*N)
-
-            for i in range(N):
-                dx2 = 0.5 * (edges[i+1] - edges[i])
-                for l in range(k):
-                    x[i*k+l] = edges[i] + dx2 * (xi[l] + 1.0)
-                    P[i*k+l] = dx2 * w[l]
+            # compute quad weights and points (cell by cell, as tensor
+            # products of the cell half-widths and the reference nodes)
+            dx2 = 0.5 * np.diff(edges)
 
-            self.P = P
-            self.x = x
+            self.x = (edges[:-1, np.newaxis]
+                      + dx2[:, np.newaxis] * (xi + 1.0)).ravel()
+            self.P = (dx2[:, np.newaxis] * w).ravel()
 
         else:
 
@@ -107,9 +106,4 @@ class GaussQuad(base.Method):
     def sample(self, kernel, t):
         """Update the integration matrix A."""
 
-        N = len(self.P)
-        A = np.empty((N, N))
-        for j in range(len(self.x)):
-            A[j, :] = self.P * kernel.kernel(self.x, self.x[j], t)
-
-        self.A = A
+        self.A = self.assemble(kernel, self.x, self.x, t, self.P)
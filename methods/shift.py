@@ -0,0 +1,73 @@
+"""Shifted growth stencils.
+
+For kernels of the form k(x, y) = s(x) g(y - a x - c), where only the
+survival s and the scalar shift c change from year to year, the
+projection matrix is I(c) G diag(s).  G is a base stencil that is
+sampled once (on a target mesh padded on both sides) and I(c) is the
+sparse cubic interpolation that shifts its output by c.
+
+"""
+
+import numpy as np
+import scipy.sparse
+
+
+class ShiftedStencil(object):
+    """Matrix I G diag(s), where I shifts by *delta* (fractional) cells.
+
+    The base stencil *G* has *p* padding rows on both sides of the N
+    target rows.  If *transposed* is True, the matrix is the transpose
+    diag(s) G^T I^T.
+    """
+
+    def __init__(self, G, delta, s, p, transposed=False):
+
+        n = G.shape[1]
+
+        # target i lands at the fractional row i + p - delta of G;
+        # interpolate with the 4 point (cubic) Lagrange stencil
+        q = p - delta
+        k = int(np.floor(q))
+        u = q - k
+
+        w = [ -u*(u-1)*(u-2)/6.0,
+              (u+1)*(u-1)*(u-2)/2.0,
+              -(u+1)*u*(u-2)/2.0,
+              (u+1)*u*(u-1)/6.0 ]
+
+        self.I = scipy.sparse.diags(w, range(k-1, k+3), shape=(n, G.shape[0]),
+                                    format='csr')
+
+        self.G = G
+        self.delta = delta
+        self.s = np.asarray(s, dtype=float) * np.ones(n)
+        self.p = p
+        self.shape = (n, n)
+        self.dtype = np.dtype(float)
+        self.transposed = transposed
+
+
+    def dot(self, x):
+        """Return the product of the matrix with *x* (a vector, or columns)."""
+
+        x = np.asarray(x, dtype=float)
+        s = self.s if x.ndim == 1 else self.s[:, np.newaxis]
+
+        if self.transposed:
+            return s * self.G.T.dot(self.I.T.dot(x))
+
+        return self.I.dot(self.G.dot(s * x))
+
+
+    @property
+    def T(self):
+        return ShiftedStencil(self.G, self.delta, self.s, self.p, not self.transposed)
+
+
+    def toarray(self):
+        """Return the matrix as a dense array."""
+
+        A = self.I.dot(self.G) * self.s
+        if self.transposed:
+            return A.T
+        return A
@@ -0,0 +1,79 @@
+"""Diagonally scaled Toeplitz projection matrices applied with FFTs.
+
+For translation invariant kernels k(x, y) = s(x) g(y - x) sampled on a
+uniform mesh, the projection matrix is T diag(s) where T is a Toeplitz
+matrix.  Only the first column and row of T (the generator) are
+stored, and matrix-vector products are computed in O(N log N) by
+embedding T in a circulant matrix.
+
+"""
+
+import numpy as np
+import scipy.linalg
+
+from numpy.fft import rfft, irfft
+
+
+class Toeplitz(object):
+    """Matrix T diag(s), where T has first column *c* and first row *r*.
+
+    If *transposed* is True, the matrix is the transpose diag(s) T^T.
+    """
+
+    def __init__(self, c, r, s, transposed=False):
+
+        c = np.asarray(c, dtype=float)
+        r = np.asarray(r, dtype=float)
+
+        n = len(c)
+        m = 2**int(np.ceil(np.log2(2*n - 1)))
+
+        # first column of the circulant embedding
+        v = np.zeros(m)
+        v[:n] = c
+        v[m-n+1:] = r[:0:-1]
+
+        self.c = c
+        self.r = r
+        self.s = np.asarray(s, dtype=float) * np.ones(n)
+        self.n = n
+        self.m = m
+        self.shape = (n, n)
+        self.dtype = np.dtype(float)
+        self.transposed = transposed
+
+        self._fv = rfft(v)
+
+
+    def _circulant(self, x, fv):
+        if x.ndim == 1:
+            return irfft(fv * rfft(x, self.m), self.m)[:self.n]
+        return irfft(fv[:, np.newaxis] * rfft(x, self.m, axis=0),
+                     self.m, axis=0)[:self.n]
+
+
+    def dot(self, x):
+        """Return the product of the matrix with *x* (a vector, or columns)."""
+
+        x = np.asarray(x, dtype=float)
+        s = self.s if x.ndim == 1 else self.s[:, np.newaxis]
+
+        if self.transposed:
+            # the transpose of T is applied with the conjugate spectrum
+            return s * self._circulant(x, np.conj(self._fv))
+
+        return self._circulant(s * x, self._fv)
+
+
+    @property
+    def T(self):
+        return Toeplitz(self.c, self.r, self.s, not self.transposed)
+
+
+    def toarray(self):
+        """Return the matrix as a dense array."""
+
+        A = scipy.linalg.toeplitz(self.c, self.r) * self.s
+        if self.transposed:
+            return A.T
+        return A
@@ -9,27 +9,117 @@ class MidPointZuidema(base.Method):
 
     name = 'Zuidema'
     mesh_type = 'cell'
-    sub_mesh_size = 200
+
+    cache_parameters = base.Method.cache_parameters + ( 'sub_mesh_size',
+                                                        'refine_tol' )
+
+
+    def __init__(self, sub_mesh_size=200, refine_tol=None, block_bytes=None):
+        """Create a Zuidema method.
+
+        Each cell is split into *sub_mesh_size* sub-cells.  If
+        *refine_tol* is given, the sub-mesh is refined adaptively (by
+        tripling the number of sub-cells) only for the source cells
+        whose matrix column changes by more than *refine_tol* relative
+        to the largest entry.  The source cells that have not
+        converged once tripling would exceed *sub_mesh_size* are
+        integrated with exactly *sub_mesh_size* sub-cells.  If
+        *block_bytes* is given, it overrides the memory ceiling of the
+        kernel blocks.
+        """
+
+        self.sub_mesh_size = sub_mesh_size
+        self.refine_tol = refine_tol
+
+        if block_bytes:
+            self.block_bytes = block_bytes
+
+
+    def sub_mesh_sum(self, kernel, t, offsets, cols):
+        """Sum the kernel over the given sub-mesh offsets.
+
+        Returns the matrix with entries sum_m k(X[j]+o_m, X[i]+o_m, t)
+        for all target cells i and the source cells j in *cols*.
+        """
+
+        Xl = self.X[:-1]
+        count = getattr(kernel, 'count', None)
+
+        S = np.zeros((self.N, len(cols)))
+        for o in offsets:
+            for b in self.blocks(len(cols), self.N):
+                S[:, b] += self.kernel_matrix(kernel, Xl[cols[b]] + o, Xl + o, t)
+
+        # count as evaluating the kernel one pair of cells at a time
+        # (at all sub-mesh points of both cells)
+        if count is not None:
+            kernel.count = count + 2 * len(offsets) * self.N * len(cols)
+
+        return S
 
 
     def sample(self, kernel, t):
 
-        N = self.N
-        U = self.U
-        L = self.L
-        M = self.sub_mesh_size
-        X = self.X
+        N  = self.N
+        dx = (self.U - self.L) / N
+        M  = self.sub_mesh_size
+
+        if not self.refine_tol:
+            h = dx / M
+            S = self.sub_mesh_sum(kernel, t, h * (np.arange(M) + 0.5),
+                                  np.arange(N))
+            self.A = h * S
+            if self.sparse_tol:
+                self.A = self.truncate(self.A)
+
+            logging.debug("ZUIDEMA: update: kernel sampled")
+            return
+
+        # adaptive: start with one sub-cell per cell and triple the
+        # number of sub-cells of the unconverged source cells; the
+        # tripled sub-mesh mid-points contain the previous ones
+        m = 1
+        active = np.arange(N)
+        S = self.sub_mesh_sum(kernel, t, [ 0.5 * dx ], active)
+        A = dx * S
+
+        while len(active) > 0 and 3*m <= M:
+
+            h = dx / (3*m)
+            offsets = [ h * (l + 0.5) for l in range(3*m) if l % 3 != 1 ]
+
+            Sa = S[:, active] + self.sub_mesh_sum(kernel, t, offsets, active)
+            Aa = h * Sa
+
+            change = abs(Aa - A[:, active]).max(axis=0)
+            scale  = abs(Aa).max()
+
+            A[:, active] = Aa
+            S[:, active] = Sa
+            active = active[change > self.refine_tol * scale]
+            m = 3*m
+
+            logging.debug("ZUIDEMA: sub mesh size: %d, unconverged: %d", m, len(active))
+
+        if len(active) > 0 and m < M:
+            # final pass with the full sub-mesh for the unconverged cells
+            h  = dx / M
+            Aa = h * self.sub_mesh_sum(kernel, t, h * (np.arange(M) + 0.5),
+                                       active)
+
+            change = abs(Aa - A[:, active]).max(axis=0)
+            scale  = abs(Aa).max()
 
-        h = (U - L) / N / M
+            A[:, active] = Aa
+            active = active[change > self.refine_tol * scale]
+            m = M
 
-        A = np.zeros((N, N))
-        for i in range(N):
-            logging.debug('ZUIDEMA: sampling (%d): %d', N, i)
-            y = np.arange(X[i]+h/2, X[i+1], h)
-            for j in range(N):
-                x = np.arange(X[j]+h/2, X[j+1], h)
-                A[i, j] = np.sum(kernel.kernel(x, y, t))
+        if len(active) > 0:
+            logging.warning("ZUIDEMA: %d source cells not converged with "
+                            "sub mesh size %d", len(active), m)
 
-        self.A = h * A
+        self.A = A
+        if self.sparse_tol:
+            self.A = self.truncate(A)
 
         logging.debug("ZUIDEMA: update: kernel sampled")
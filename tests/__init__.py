@@ -0,0 +1,80 @@
+"""Regression tests.
+
+Run from the top-level directory (the kernels read their data files
+relative to it) with
+
+  $ python -m unittest discover tests
+
+"""
+
+import unittest
+
+import numpy as np
+
+from kernels import ARTTRI, Zuidema
+
+
+def dense(A):
+    """Return *A* (dense, sparse or structured) as an ndarray."""
+
+    if hasattr(A, 'toarray'):
+        A = A.toarray()
+    return np.asarray(A, dtype=float)
+
+
+def relerr(a, b):
+    """Return the max. relative difference of *a* to the baseline *b*."""
+
+    a, b = dense(a), dense(b)
+    return abs(a - b).max() / abs(b).max()
+
+
+def eig(A, left=False):
+    """Return the dominant eigenvalue and (positive) eigenvector of *A*."""
+
+    A = dense(A)
+    if left:
+        A = A.T
+
+    ev, V = np.linalg.eig(A)
+    i = abs(ev).argmax()
+    v = abs(V[:, i].real)
+
+    return ev[i].real, v / v.max()
+
+
+def setup_kernel(K, method, N, t=0, **kwargs):
+    """Return the kernel *K* set up with *method* on N cells and
+    sampled at time *t* (Zuidema samples itself in setup)."""
+
+    k = K()
+    k.reset_count()
+    k.setup(method, N, **kwargs)
+    if not isinstance(k, Zuidema):
+        k.update(t)
+    return k
+
+
+def artr(method, N, **kwargs):
+    """Return the ARTTRI kernel (with uniform fecundity) set up with
+    *method* on N cells."""
+
+    k = ARTTRI()
+    k.fecundity_type = 'uniform_noexp'
+    k.setup(method, N, **kwargs)
+    return k
+
+
+class ProjectionTestCase(unittest.TestCase):
+
+    def assertProjects(self, k, A, tol):
+        """Check the matrix and the products of *k* against *A*."""
+
+        rs = np.random.RandomState(0)
+        n  = rs.rand(A.shape[1])
+        X  = rs.rand(A.shape[1], 3)
+
+        self.assertLess(relerr(k.projection_matrix, A), tol)
+        self.assertLess(relerr(k.project(n), A.dot(n)), tol)
+        self.assertLess(relerr(k.project_many(X), A.dot(X)), tol)
+        self.assertLess(relerr(k.rproject(n), A.T.dot(n)), tol)
@@ -0,0 +1,223 @@
+"""ABB kernels on synthetic measurements against the original
+per-individual loops."""
+
+import unittest
+
+import numpy as np
+
+from numpy import pi, exp
+
+from kernels.abb import ABBSW, ABBAW, Community
+from methods import MidPoint
+from utils.stats import dnorm
+
+from tests import relerr
+
+
+L, U = 0.0, 400.0
+
+
+def abb(K, N, plot_size=400.0, seed=0):
+    """Return the kernel *K* set up on N cells, with synthetic
+    measurements and populations."""
+
+    rs = np.random.RandomState(seed)
+
+    k = K()
+    k.L, k.U = L, U
+    k.setup(MidPoint(), N)
+
+    k.plot_size = plot_size
+    k.sw0 = list(rs.uniform(5, 80, 40))
+    k.aw0 = list(rs.uniform(5, 120, 30))
+
+    k.nsw = 1e3 * rs.rand(N) * exp(-k.x / 50.0)
+    k.naw = 1e3 * rs.rand(N) * exp(-k.x / 80.0)
+
+    return k
+
+
+def old_indices(k):
+    """Return the competition indices at the mesh points, summed tree
+    by tree."""
+
+    P, x, nsw, naw = k.method.P, k.x, k.nsw, k.naw
+
+    c = dict((name, np.empty(len(x))) for name in
+             [ 'sw_pct', 'aw_pct', 'sw_psd', 'aw_pba', 'net_pba' ])
+    for j in range(len(x)):
+        ba = pi * (x[j:]/2.0)**2
+        c['sw_pct'][j]  = np.dot(P[j:], nsw[j:]) / 1e3
+        c['aw_pct'][j]  = np.dot(P[j:], naw[j:]) / 1e3
+        c['sw_psd'][j]  = np.dot(P[j:], nsw[j:] * x[j:]) / 1e3
+        c['aw_pba'][j]  = np.dot(P[j:], naw[j:] * ba) / 1e6
+        c['net_pba'][j] = np.dot(P[j:], (naw[j:] + nsw[j:]) * ba) / 1e6
+
+    return c
+
+
+def old_kernel(k, x, y, c):
+    """Return the kernel at the points (x, y) with the competition
+    indices *c* at x (as the original ABBSW and ABBAW kernels)."""
+
+    one = np.ones(len(x))
+    sd  = k.sd
+
+    if isinstance(k, ABBSW):
+        xi = np.vstack([ one, x, c['sw_psd'], c['aw_pct'] + c['sw_pct'], x**2 ])
+        mu = np.dot(k.growth_params, xi)
+        mu = np.where(mu > x, mu, x)
+
+        xi = np.vstack([ one, x, c['sw_psd'], c['aw_pba'] ])
+        eta = np.dot(k.survival_params, xi)
+        s  = exp(eta) / (1.0 + exp(eta))
+    else:
+        xi = np.vstack([ one, x, c['sw_psd'], x**2 ])
+        mu = np.dot(k.growth_params, xi)
+        mu = np.where(mu > x, mu, x)
+        s  = 0.99
+
+    return s * dnorm(y, mu, sd=sd)
+
+
+def old_from_meas(k, x):
+    """Return the competition indices at the size *x* from the
+    measurements, scanning all trees."""
+
+    sw = [ d for d in k.sw0 if d > x ]
+    aw = [ d for d in k.aw0 if d > x ]
+
+    return {
+        'sw_pct':  float(len(sw)) / (k.plot_size / 10.0),
+        'aw_pct':  float(len(aw)) / (k.plot_size / 10.0),
+        'sw_psd':  float(sum(sw)) / (k.plot_size / 10.0),
+        'aw_pba':  sum([ pi * (d/2.0)**2 for d in aw ]) / (k.plot_size * 100.0),
+        'net_pba': sum([ pi * (d/2.0)**2 for d in sw + aw ]) / (k.plot_size * 100.0),
+    }
+
+
+class CompetitionTestCase(unittest.TestCase):
+
+    N = 101
+
+    def test_indices(self):
+        k = abb(ABBSW, self.N)
+        c = k.competition_indices(k.nsw, k.naw)
+        d = old_indices(k)
+        for name in d:
+            self.assertLess(relerr(c[name], d[name]), 1e-12)
+
+            # the per-index methods agree with the cached indices
+            ix = np.arange(self.N)
+            self.assertLess(relerr(getattr(k, name)(k.x, ix), d[name]), 1e-12)
+
+    def test_kernel_matrix(self):
+        for K in [ ABBSW, ABBAW ]:
+            k = abb(K, self.N)
+            k.update(k.nsw, k.naw, 0)
+            c = old_indices(k)
+
+            x = k.x
+            A = np.empty((self.N, self.N))
+            for i in range(self.N):
+                A[i, :] = old_kernel(k, x, x[i] * np.ones(self.N), c)
+
+            ix = np.arange(self.N)
+            self.assertLess(relerr(k.kernel_matrix(x, x, 0, ix=ix), A), 1e-12)
+            self.assertLess(relerr(k.method.A, k.method.P * A), 1e-12)
+
+
+class MeasurementTestCase(unittest.TestCase):
+
+    def test_from_meas(self):
+        k = abb(ABBSW, 11)
+
+        # below, between, at and above the measurements
+        x = np.concatenate([ [ 0.0, 200.0 ], k.sw0[:5], k.aw0[:5],
+                             np.linspace(1, 130, 50) ])
+
+        for name in [ 'sw_pct', 'aw_pct', 'sw_psd', 'aw_pba', 'net_pba' ]:
+            f = getattr(k, name + '_from_meas')
+            r = [ old_from_meas(k, xi)[name] for xi in x ]
+            self.assertLess(relerr(f(x), r), 1e-12)
+            self.assertLess(relerr([ f(xi) for xi in x ], r), 1e-12)
+
+    def test_kernel(self):
+        for K in [ ABBSW, ABBAW ]:
+            k = abb(K, 11)
+            y = np.linspace(0, 150, 31)
+            for xi in [ 0.0, k.sw0[0], 37.5, 150.0 ]:
+                c = dict((name, np.array([ v ]))
+                         for name, v in old_from_meas(k, xi).items())
+                self.assertLess(relerr(k.kernel(xi, y, 0),
+                                       old_kernel(k, np.array([ xi ]), y, c)),
+                                1e-12)
+
+    def test_update(self):
+        # setting the measurements re-indexes them
+        k = abb(ABBSW, 11)
+        k.sw0 = k.aw0
+        x = np.linspace(1, 130, 50)
+        self.assertLess(relerr(k.sw_psd_from_meas(x),
+                               [ old_from_meas(k, xi)['sw_psd'] for xi in x ]),
+                        1e-12)
+
+
+class BandTestCase(unittest.TestCase):
+
+    N = 101
+
+    def test_years(self):
+        for reuse in [ False, True ]:
+            k = abb(ABBSW, self.N)
+            k.method.reuse_band = reuse
+
+            nsw, naw = k.nsw, k.naw
+            k.update(nsw, naw, 0)
+            A0 = k.projection_matrix
+            A1 = np.array(A0)
+
+            # the next year, with other populations
+            f = abb(ABBSW, self.N, seed=1)
+            f.update(f.nsw, f.naw, 1)
+            k.update(f.nsw, f.naw, 1)
+
+            self.assertEqual(relerr(k.projection_matrix, f.projection_matrix), 0)
+            self.assertEqual(k.projection_matrix is A0, reuse)
+            if not reuse:
+                # matrices kept from earlier years are left alone
+                self.assertEqual(relerr(A0, A1), 0)
+
+
+class CommunityTestCase(unittest.TestCase):
+
+    N = 101
+
+    def test_update(self):
+        for flags in [ {}, { 'competition': False, 'sw_mort': 'const' } ]:
+            c = Community(L, U)
+            c.setup(MidPoint(), self.N)
+            c.set_flags(flags)
+
+            sw, aw = abb(ABBSW, self.N), abb(ABBAW, self.N)
+            for k in [ sw, aw ]:
+                for flag in flags:
+                    setattr(k, flag, flags[flag])
+
+            nsw, naw = sw.nsw, sw.naw
+            for t in range(3):
+                c.update(nsw, naw, t)
+                for k in [ sw, aw ]:
+                    k.update(nsw, naw, t)
+
+                self.assertEqual(relerr(c.sw.method.A, sw.method.A), 0)
+                self.assertEqual(relerr(c.aw.method.A, aw.method.A), 0)
+                self.assertIsNot(c.sw.method.A, c.aw.method.A)
+
+                nsw, naw = c.project(nsw, naw)
+                self.assertEqual(relerr(nsw, sw.project(sw.nsw)), 0)
+                self.assertEqual(relerr(naw, aw.project(aw.naw)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Pooled ABB runs against serial runs, on synthetic plots."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.abbrun import abb_plots, abb_run, abb_collect
+
+# the jobs import these lazily, from the plot directory the tests change to
+import kernels.abb
+import methods.midpoint
+
+from tests import relerr
+
+
+L, U, N = 0.0, 400.0, 50
+
+flavours = {
+    'full':  {},
+    'nocomp': { 'competition': False },
+}
+
+
+def write_plots(path, plots, seed=0):
+    """Write synthetic measurements of *plots* (and their sizes) to
+    path/kernels/abb."""
+
+    rs = np.random.RandomState(seed)
+
+    path = os.path.join(path, 'kernels', 'abb')
+    os.makedirs(path)
+
+    with open(os.path.join(path, 'plotsizes.csv'), 'w') as f:
+        f.write('plot,plotsize\n')
+        for plotname in plots:
+            f.write('%s,%g\n' % (plotname, rs.uniform(400, 1000)))
+
+    for plotname in plots:
+        with open(os.path.join(path, '%s.csv' % plotname), 'w') as f:
+            f.write('plot,spec,year,dbh\n')
+            for year in [ 2000, 2003 ]:
+                for spec, n, dmax in [ ('SW', 30, 80), ('AW', 20, 120),
+                                       ('PB', 5, 40) ]:
+                    for d in rs.uniform(5, dmax, n):
+                        f.write('%s,%s,%d,%.1f\n' % (plotname, spec, year, d))
+
+
+class RunTestCase(unittest.TestCase):
+
+    plots = [ 'p1', 'p2', 'p3' ]
+
+    def setUp(self):
+        self.cwd  = os.getcwd()
+        self.path = tempfile.mkdtemp()
+        write_plots(self.path, self.plots)
+        os.chdir(self.path)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.path)
+
+    def test_pool(self):
+        self.assertEqual(abb_plots(), self.plots)
+
+        serial = abb_run(flavours, self.plots, workers=1, L=L, U=U, N=N,
+                         out='serial')
+        pooled = abb_run(flavours, self.plots, workers=2, L=L, U=U, N=N,
+                         out='pooled')
+        self.assertEqual(len(serial), len(flavours) * len(self.plots))
+        self.assertEqual(len(pooled), len(serial))
+
+        for flavour in flavours:
+            s = abb_collect(flavour, flavours[flavour], self.plots, L, U, N,
+                            out='serial')
+            p = abb_collect(flavour, flavours[flavour], self.plots, L, U, N,
+                            out='pooled')
+            self.assertTrue(os.path.exists('pooled/abb_%s.pkl' % flavour))
+            self.assertEqual(sorted(p), self.plots)
+
+            for plotname in self.plots:
+                for name in [ 'nsw', 'naw' ]:
+                    self.assertGreater(abs(s[plotname][name]).max(), 0)
+                    self.assertEqual(relerr(p[plotname][name],
+                                            s[plotname][name]), 0)
+
+        # the flavours differ
+        p = [ abb_collect(flavour, flavours[flavour], self.plots, L, U, N,
+                          out='pooled')['p1']['nsw'] for flavour in flavours ]
+        self.assertGreater(relerr(p[0], p[1]), 0)
+
+    def test_skip(self):
+        abb_run(flavours, self.plots[:2], workers=2, L=L, U=U, N=N)
+        self.assertEqual(len(abb_run(flavours, self.plots, workers=2,
+                                     L=L, U=U, N=N)), len(flavours))
+
+        # other parameters or flags are recomputed
+        self.assertEqual(len(abb_run(flavours, self.plots, L=L, U=U, N=N+1)),
+                         len(flavours) * len(self.plots))
+        self.assertEqual(len(abb_run({ 'full': { 'competition': False } },
+                                     self.plots, L=L, U=U, N=N)),
+                         len(self.plots))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Matrix cache round trips."""
+
+import shutil
+import tempfile
+import unittest
+
+from kernels import Exact, EED, ARTTRI, Zuidema
+from methods import MidPoint, GaussQuad, INTClark, MidPointZuidema
+
+from utils.cache import MatrixCache
+
+from tests import relerr, setup_kernel
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = MatrixCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        for K, method in [ (Exact, MidPoint), (EED, lambda: GaussQuad(k=3)),
+                           (EED, lambda: INTClark(k=3)),
+                           (Zuidema, lambda: MidPointZuidema(sub_mesh_size=5)) ]:
+            d = setup_kernel(K, method(), 30)
+
+            # the first kernel stores the matrix, the second loads it
+            for i in range(2):
+                k = K()
+                k.cache = self.cache
+                k.reset_count()
+                k.setup(method(), 30)
+                if K is not Zuidema:
+                    k.update(0)
+                self.assertEqual(relerr(k.method.A, d.method.A), 0)
+
+            self.assertEqual(k.count, 0)
+
+    def test_key(self):
+        k = setup_kernel(Exact, MidPoint(), 30)
+        m = MidPoint()
+        m.setup(k.L, k.U, 31)
+        self.assertNotEqual(self.cache.key(k, k.method), self.cache.key(k, m))
+
+        m.setup(k.L, k.U, 30, precision='single')
+        self.assertNotEqual(self.cache.key(k, k.method), self.cache.key(k, m))
+
+        m.setup(k.L, k.U, 30)
+        self.assertEqual(self.cache.key(k, k.method), self.cache.key(k, m))
+
+    def test_uncacheable(self):
+        self.assertFalse(self.cache.cacheable(ARTTRI(), MidPoint()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Dominant eigenpairs against dense eigensolves."""
+
+import unittest
+
+from kernels import Exact, EED, Zuidema
+from methods import MidPoint
+
+from utils.eigen import dominant_eigenpair
+
+from tests import relerr, setup_kernel, artr, eig
+
+
+def counted(k):
+    """Count the projections of the kernel *k* in k.projections."""
+
+    project = k.project
+
+    def f(n):
+        k.projections += 1
+        return project(n)
+
+    k.projections = 0
+    k.project = f
+
+
+class EigenTestCase(unittest.TestCase):
+
+    N = 80
+
+    cases = [ (Exact, {}), (Exact, {'toeplitz': True}),
+              (EED, {'low_rank': True}), (EED, {'sparse_tol': 1e-12}),
+              (EED, {'matrix_free': True}), (Zuidema, {}),
+              (Zuidema, {'matrix_free': True}) ]
+
+    def test_dominant_eigenpair(self):
+        k = setup_kernel(EED, MidPoint(), self.N)
+        A = k.projection_matrix
+        lam, v = eig(A)
+
+        gr, w = dominant_eigenpair(A, self.N)
+        self.assertLess(abs(gr - lam) / lam, 1e-10)
+        self.assertLess(relerr(w / w.max(), v), 1e-8)
+
+        gr, w = dominant_eigenpair(A.dot, self.N, v0=v)
+        self.assertLess(abs(gr - lam) / lam, 1e-10)
+
+    def test_eigenpair(self):
+        for K, kwargs in self.cases:
+            k = setup_kernel(K, MidPoint(), self.N, **kwargs)
+            A = k.A if K is Zuidema else k.projection_matrix
+
+            lam, v = eig(A)
+            gr, w  = k.eigenpair()
+            self.assertLess(abs(gr - lam) / lam, 1e-10)
+            self.assertLess(relerr(w / w.max(), v), 1e-8)
+            self.assertLess(abs(k.asymptotic_growth_rate() - lam) / lam, 1e-10)
+
+            lam, v = eig(A, left=True)
+            gr, w  = k.eigenpair(left=True)
+            self.assertLess(abs(gr - lam) / lam, 1e-10)
+            self.assertLess(relerr(w / w.max(), v), 1e-8)
+
+    def test_concentrated(self):
+        # the first iterate of ARTR is concentrated on a single entry
+        # above the floor, where the estimates agree
+        k = artr(MidPoint(), 60)
+        k.update(1936)
+        lam, v = eig(k.projection_matrix)
+        self.assertLess(abs(k.asymptotic_growth_rate() - lam) / lam, 1e-10)
+
+    def test_warm_start(self):
+        # the eigenvector of the previous year is kept by the kernel
+        # (update samples before it sets the climate row)
+        warm = artr(MidPoint(), self.N)
+        warm.update(1935)
+        warm.sample(1935)
+        warm.eigenpair()
+
+        cold = artr(MidPoint(), self.N)
+        for k in [ warm, cold ]:
+            k.update(1936)
+            k.sample(1936)
+            counted(k)
+
+        gr, _ = warm.eigenpair()
+        self.assertAlmostEqual(gr, cold.eigenpair()[0], places=12)
+        self.assertLess(warm.projections, cold.projections)
+
+        # restarting from the eigenvector converges at once
+        warm.projections = 0
+        warm.eigenpair()
+        self.assertLessEqual(warm.projections, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+"""Parameter-uncertainty ensembles on a process pool."""
+
+import unittest
+
+from utils.ensemble import artr_ensemble
+
+
+class EnsembleTestCase(unittest.TestCase):
+
+    def test_workers(self):
+        serial = artr_ensemble(4, workers=1, N=50, seed=3)
+        pooled = artr_ensemble(4, workers=2, N=50, seed=3)
+
+        self.assertEqual(sorted(serial), sorted(pooled))
+        for name in serial:
+            self.assertEqual(serial[name].shape[0], 4)
+            self.assertTrue((serial[name] == pooled[name]).all())
+
+        # the draws differ
+        p = serial['populations']
+        self.assertTrue((p[0, 1:] != p[1, 1:]).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Kernel helpers against the original per-point evaluations and lookups."""
+
+import unittest
+
+import numpy as np
+
+from methods import MidPoint
+from utils.io import read_csv
+
+from tests import relerr, artr
+
+
+class EmpiricalTestCase(unittest.TestCase):
+
+    def test_first_projection(self):
+        k = artr(MidPoint(), 50)
+        k.update(1935)
+        k.n0 = np.random.RandomState(0).normal(-1.0, 1.0, 2000)
+
+        # sum the kernel one measurement at a time
+        f = lambda y: sum(map(lambda x: k.kernel(x, y, 0), k.n0))
+        n = k.method.eval_or_integrate(f)
+
+        self.assertLess(relerr(k.first_projection(), n), 1e-12)
+
+        # the binned projection converges as O(h^2)
+        errors = [ relerr(k.first_projection(bins=b), n)
+                   for b in [ 20, 40, 80, 160 ] ]
+        for e1, e2 in zip(errors[:-1], errors[1:]):
+            self.assertLess(e2, e1 / 3.0)
+        self.assertLess(errors[-1], 1e-4)
+
+
+class ClimateTestCase(unittest.TestCase):
+
+    def test_covariats(self):
+        k = artr(MidPoint(), 20)
+        climate = read_csv('kernels/artr/climate.csv')
+
+        years = [ k.years[0], 1935, 1940, 1941, 1950, k.years[-1] ]
+        rows  = k.climate_row(years)
+
+        for factor in [ 1.0, 1.1 ]:
+            k.tweak('pptWin2', factor)
+            c = k.covariats(rows)
+
+            for j, t in enumerate(years):
+                k.update(t)
+                row = max(0, t - int(k.years[0]) - 1)
+                self.assertEqual(k.row, row)
+
+                for name in c:
+                    v = float(getattr(climate[row], name))
+                    if name == 'pptWin2':
+                        v = v * factor
+                    self.assertEqual(c[name][j], k.covariat(name))
+                    self.assertEqual(k.covariat(name), v)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Projection matrix libraries against direct sampling."""
+
+import unittest
+
+import numpy as np
+
+from methods import MidPoint
+
+from utils.library import MatrixLibrary
+
+from tests import relerr, artr
+
+
+class LibraryTestCase(unittest.TestCase):
+
+    N    = 40
+    rows = [ 2, 4, 6 ]
+
+    def test_matrices(self):
+        k = artr(MidPoint(), self.N)
+        k.row = 4
+        k.method.sample(k, 0)
+        A = np.array(k.method.A)
+
+        lib = MatrixLibrary(k, self.rows)
+
+        # the matrix of the kernel is left alone
+        self.assertEqual(k.row, 4)
+        self.assertEqual(relerr(k.method.A, A), 0)
+        self.assertEqual(relerr(lib.A[lib.index(4)], A), 0)
+
+        n = np.random.RandomState(0).rand(self.N)
+        for r in self.rows:
+            k.row = r
+            k.method.sample(k, 0)
+            self.assertLess(relerr(lib.project(n, lib.index(r)),
+                                   k.method.A.dot(n)), 1e-12)
+
+    def test_modes(self):
+        lib = MatrixLibrary(artr(MidPoint(), self.N), self.rows)
+
+        n = np.random.RandomState(0).rand(self.N)
+        sequence = [ 0, 1, 2 ] * 5
+
+        # tolerances of the products and of the growth rate; shifted
+        # stencils are interpolated (see methods/shift.py)
+        for kwargs, tol, gtol in [ ({'precision': 'single'}, 1e-5, 1e-5),
+                                   ({'sparse_tol': 1e-10}, 1e-8, 1e-8),
+                                   ({'low_rank': True}, 1e-10, 1e-10),
+                                   ({'shift': True}, 1e-6, 1e-3) ]:
+            other = MatrixLibrary(artr(MidPoint(), self.N, **kwargs), self.rows)
+
+            for j in range(len(self.rows)):
+                self.assertLess(relerr(other.project(n, j), lib.project(n, j)),
+                                tol)
+
+            gr = lib.stochastic_growth_rate(sequence)
+            self.assertLess(abs(other.stochastic_growth_rate(sequence) - gr) / gr,
+                            gtol)
+
+    def test_sparse_path(self):
+        k = artr(MidPoint(), self.N, sparse_tol=1e-10)
+        self.assertRaises(ValueError, MatrixLibrary, k, self.rows, 'lib.npy')
+
+
+if __name__ == '__main__':
+    unittest.main()
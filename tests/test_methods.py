@@ -0,0 +1,182 @@
+"""Vectorized and structured projections of the methods against the
+dense baseline matrix."""
+
+import unittest
+
+import numpy as np
+import scipy.integrate
+
+from kernels import Exact, EED, Zuidema
+from methods import MidPoint, GaussQuad, INTClark, GENClark, MidPointZuidema
+
+from tests import ProjectionTestCase, relerr, setup_kernel, artr
+
+
+class KernelMatrixTestCase(unittest.TestCase):
+
+    N = 40
+
+    def test_midpoint(self):
+        # MidPoint used to sample the kernel one target point at a time
+        kernels = [ setup_kernel(K, MidPoint(), self.N)
+                    for K in [ Exact, EED, Zuidema ] ]
+        a = artr(MidPoint(), self.N)
+        a.update(1935)
+        a.sample(1935)          # update samples before it sets the climate row
+        kernels.append(a)
+
+        for k in kernels:
+            m, t = k.method, (1935 if k is a else 0)
+            x, ix = m.x, np.arange(self.N)
+
+            A = np.zeros((self.N, self.N))
+            for i in xrange(self.N):
+                A[i, :] = m.dx * k.kernel(x, x[i], t, ix=ix, iy=i)
+
+            self.assertLess(relerr(m.A, A), 1e-14)
+
+
+class ZuidemaTestCase(unittest.TestCase):
+
+    def test_refine(self):
+        # cells that don't converge end up on the full sub-mesh
+        for M in [ 81, 200 ]:
+            d = setup_kernel(EED, MidPointZuidema(sub_mesh_size=M), 20)
+            k = setup_kernel(EED, MidPointZuidema(sub_mesh_size=M,
+                                                  refine_tol=1e-9), 20)
+            self.assertLess(relerr(k.method.A, d.method.A), 1e-12)
+
+
+class IntegrateTestCase(unittest.TestCase):
+
+    def test_eval_or_integrate(self):
+        m = MidPoint()
+        m.setup(-1.0, 3.0, 37)
+
+        f = lambda x: np.exp(-x**2) * np.sin(3*x) + x**3
+
+        # the original integrated one cell at a time
+        n = np.zeros(m.N)
+        for i in range(m.N):
+            n[i], _ = scipy.integrate.fixed_quad(f, m.X[i], m.X[i+1], n=5)
+            n[i] /= m.dx
+
+        self.assertLess(relerr(m.eval_or_integrate(f, k=5), n), 1e-14)
+
+
+class ModesTestCase(ProjectionTestCase):
+
+    N = 60
+
+    def test_sparse(self):
+        for K in [ Exact, EED ]:
+            d = setup_kernel(K, MidPoint(), self.N)
+
+            m = MidPoint()
+            m.sparse_fill = 1.0
+            k = setup_kernel(K, m, self.N, sparse_tol=1e-10)
+            self.assertTrue(hasattr(k.method.A, 'nnz'))
+            self.assertProjects(k, d.projection_matrix, 1e-8)
+
+    def test_sparse_fill(self):
+        # wide kernels are stored dense
+        m = MidPoint()
+        m.sparse_fill = 0.0
+        k = setup_kernel(EED, m, self.N, sparse_tol=1e-10)
+        self.assertIsInstance(k.method.A, np.ndarray)
+
+    def test_low_rank(self):
+        for method in [ MidPoint, lambda: GENClark(k=3) ]:
+            d = setup_kernel(EED, method(), self.N)
+            k = setup_kernel(EED, method(), self.N, low_rank=True)
+            self.assertIsNotNone(k.method.F)
+            self.assertProjects(k, d.projection_matrix, 1e-10)
+
+    def test_sparse_low_rank(self):
+        d = setup_kernel(EED, MidPoint(), self.N)
+
+        m = MidPoint()
+        m.sparse_fill = 1.0
+        k = setup_kernel(EED, m, self.N, sparse_tol=1e-10, low_rank=True)
+        self.assertTrue(hasattr(k.method.A, 'nnz'))
+        self.assertIsInstance(k.projection_matrix, np.ndarray)
+        self.assertProjects(k, d.projection_matrix, 1e-8)
+
+    def test_toeplitz(self):
+        d = setup_kernel(Exact, MidPoint(), self.N)
+        k = setup_kernel(Exact, MidPoint(), self.N, toeplitz=True)
+        self.assertNotIsInstance(k.method.A, np.ndarray)
+        self.assertProjects(k, d.projection_matrix, 1e-10)
+
+    def test_shift(self):
+        # the base stencil is sampled in the first year, and shifted
+        # (interpolated) in the following years
+        d = artr(MidPoint(), self.N)
+        k = artr(MidPoint(), self.N, shift=True)
+        for t in d.T[:10]:
+            d.update(t)
+            k.update(t)
+            self.assertNotIsInstance(k.method.A, np.ndarray)
+            self.assertProjects(k, d.projection_matrix, 1e-6)
+
+    def test_matrix_free(self):
+        for K, method in [ (Exact, MidPoint), (EED, MidPoint),
+                           (EED, lambda: GaussQuad(k=3)) ]:
+            d = setup_kernel(K, method(), self.N)
+
+            m = method()
+            m.block_bytes = 8*self.N*7
+            k = setup_kernel(K, m, self.N, matrix_free=True)
+            self.assertNotIsInstance(k.method.A, np.ndarray)
+            self.assertProjects(k, d.projection_matrix, 1e-12)
+
+    def test_matrix_free_low_rank(self):
+        d = setup_kernel(EED, MidPoint(), self.N)
+        k = setup_kernel(EED, MidPoint(), self.N, matrix_free=True,
+                         low_rank=True)
+        self.assertProjects(k, d.projection_matrix, 1e-10)
+
+    def test_matrix_free_zuidema(self):
+        for method in [ MidPoint, lambda: GaussQuad(k=3) ]:
+            d = setup_kernel(Zuidema, method(), self.N)
+            k = setup_kernel(Zuidema, method(), self.N, matrix_free=True)
+            self.assertNotIsInstance(k.A, np.ndarray)
+
+            rs = np.random.RandomState(0)
+            n  = rs.rand(d.A.shape[1])
+            X  = rs.rand(d.A.shape[1], 3)
+
+            self.assertLess(relerr(k.A, d.A), 1e-12)
+            self.assertLess(relerr(k.project(n), d.A.dot(n)), 1e-12)
+            self.assertLess(relerr(k.project(X), d.A.dot(X)), 1e-12)
+            self.assertLess(relerr(k.rproject(n), d.A.T.dot(n)), 1e-12)
+
+    def test_matrix_free_unsupported(self):
+        for method in [ lambda: INTClark(k=3), lambda: GENClark(k=3),
+                        MidPointZuidema ]:
+            self.assertRaises(ValueError, setup_kernel, EED, method(), 20,
+                              matrix_free=True)
+
+    def test_single_precision(self):
+        for K in [ Exact, EED ]:
+            d = setup_kernel(K, MidPoint(), self.N)
+            k = setup_kernel(K, MidPoint(), self.N, precision='single')
+            self.assertEqual(k.method.A.dtype, np.float32)
+            self.assertEqual(k.project(np.ones(self.N)).dtype, np.float64)
+            self.assertProjects(k, d.projection_matrix, 1e-5)
+
+    def test_shift_single_precision(self):
+        d = artr(MidPoint(), self.N)
+        k = artr(MidPoint(), self.N, shift=True, precision='single')
+        for t in d.T[:3]:
+            d.update(t)
+            k.update(t)
+            self.assertProjects(k, d.projection_matrix, 1e-5)
+
+    def test_invalid_precision(self):
+        self.assertRaises(ValueError, setup_kernel, Exact, MidPoint(), 10,
+                          precision='half')
+
+
+if __name__ == '__main__':
+    unittest.main()
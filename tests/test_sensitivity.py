@@ -0,0 +1,49 @@
+"""Sensitivities and elasticities against dense eigensolves."""
+
+import unittest
+
+import numpy as np
+
+from kernels import Exact, EED, Zuidema
+from methods import MidPoint
+
+from utils.sensitivity import Sensitivity, quadrature_weights
+
+from tests import dense, relerr, setup_kernel, eig
+
+
+class SensitivityTestCase(unittest.TestCase):
+
+    N = 80
+
+    cases = [ (Exact, {}), (Exact, {'toeplitz': True}),
+              (EED, {'low_rank': True}), (EED, {'sparse_tol': 1e-12}),
+              (EED, {'matrix_free': True}), (Zuidema, {}) ]
+
+    def test_sensitivity(self):
+        for K, kwargs in self.cases:
+            k = setup_kernel(K, MidPoint(), self.N, **kwargs)
+            A = dense(k.A if K is Zuidema else k.projection_matrix)
+
+            lam, v = eig(A)
+            _,   w = eig(A, left=True)
+            S = np.outer(w, v) / np.dot(w, v)
+
+            s = Sensitivity(k)
+            self.assertLess(abs(s.lam - lam) / lam, 1e-10)
+            self.assertLess(s.error, 1e-10)
+            self.assertLess(relerr(s.matrix_sensitivity, S), 1e-8)
+
+            # the elasticities integrate to one
+            P = quadrature_weights(k)
+            E = s.elasticity_kernel()
+            ey, ex = s.elasticity_marginals()
+            self.assertAlmostEqual(np.dot(P, ey), 1.0, places=8)
+            self.assertAlmostEqual(np.dot(P, ex), 1.0, places=8)
+            self.assertAlmostEqual(np.dot(P, E.dot(P)), 1.0, places=8)
+            self.assertLess(relerr(E.dot(P), ey), 1e-8)
+            self.assertLess(relerr(P.dot(E), ex), 1e-8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+"""Process pool runner for the Alberta boreal SW and AW experiments.
+
+Every (plot, flavour) pair is an independent job.  Jobs are fanned out
+over a process pool, and each job writes its result to its own file
+as soon as it finishes, so that an interrupted run only loses the jobs
+that were running.  Result files are stored under the run parameters
+(out/abb/<flavour>/<L>_<U>_<N>/<plot>.pkl), together with the kernel
+flags and the runner *version*, and jobs are skipped only if their
+result file exists and was computed with the same parameters, flags
+and version.  The per-plot results of each flavour are collected into
+out/abb_<flavour>.pkl (the format of the serial runs) by *abb_collect*.
+
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import cPickle as pickle
+
+from glob import glob
+
+
+# bump whenever the projections change, so that old results are recomputed
+version = 1
+
+
+def abb_plots(path='kernels/abb'):
+    """Return the names of all plots with measurements in *path*."""
+
+    plots = []
+    for plotfile in sorted(glob(os.path.join(path, '*.csv'))):
+        plotname = os.path.basename(plotfile).split('.')[0]
+        if plotname == 'plotsizes':
+            continue
+        plots.append(plotname)
+
+    return plots
+
+
+def abb_project(plotname, flags, L, U, N):
+    """Project the SW and AW populations of *plotname* with the kernel
+    *flags* set.
+
+    The populations are reset to the measurements in every measurement
+    year.  Returns a dict with the arrays 'nsw' and 'naw' (years+1 x
+    N) and the tuple 'attrs'.
+    """
+
+    from kernels.abb import plot_community
+    from methods.midpoint import MidPoint
+
+    # the matrices of earlier years are not kept, so the band matrices
+    # can be overwritten
+    method = MidPoint()
+    method.reuse_band = True
+
+    plotfile  = 'kernels/abb/%s.csv' % plotname
+    community = plot_community(plotname, L, U, N, method, flags)
+    sw, aw    = community.sw, community.aw
+
+    logging.debug('PLOT: %s %f', plotname, sw.plot_size)
+
+    T = range(sw.first_year, sw.last_year+10)
+    n = np.zeros((len(T)+1, 2, len(sw.x)))
+
+    for j, t in enumerate(T):
+
+        logging.debug('year: %d', t)
+
+        if t in sw.years:
+            community.set_n0(t)
+
+            n[j+1, 0] = sw.first_projection() / sw.plot_size * 1e4
+            n[j+1, 1] = aw.first_projection() / aw.plot_size * 1e4
+
+        else:
+            # set current populations and resample
+            community.update(n[j, 0], n[j, 1], t)
+            n[j+1] = community.project(n[j, 0], n[j, 1])
+
+    return {
+        'nsw':   np.asarray(n[:, 0]),
+        'naw':   np.asarray(n[:, 1]),
+        'attrs': (L, U, N, T, sw.x, plotfile),
+    }
+
+
+def abb_result_path(out, flavour, plotname, L, U, N):
+    return os.path.join(out, 'abb', flavour, '%g_%g_%d' % (L, U, N),
+                        '%s.pkl' % plotname)
+
+
+def abb_load(path, config):
+    """Return the result stored in *path*, or None if there is none or
+    it was computed with another *config*."""
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as f:
+        stored, result = pickle.load(f)
+
+    if stored != config:
+        return None
+
+    return result
+
+
+def _abb_job(job):
+
+    plotname, flavour, config, out = job
+
+    t0 = time.time()
+
+    result = abb_project(plotname, config['flags'],
+                         config['L'], config['U'], config['N'])
+
+    # write to a temporary file first, so that partial results are never
+    # mistaken for finished jobs
+    path = abb_result_path(out, flavour, plotname,
+                           config['L'], config['U'], config['N'])
+    with open(path + '.tmp', 'w') as f:
+        pickle.dump((config, result), f)
+    os.rename(path + '.tmp', path)
+
+    return plotname, flavour, time.time() - t0
+
+
+def abb_config(flags, L, U, N):
+    return { 'flags': dict(flags), 'L': L, 'U': U, 'N': N, 'version': version }
+
+
+def abb_run(flavours, plots, workers=1, L=0.0, U=800.0, N=801, out='out',
+            overwrite=False):
+    """Run the (plot, flavour) jobs of all *plots* and *flavours* (a dict
+    of flavour: kernel flags) on a pool of *workers* processes.
+
+    Each job writes its result to out/abb/<flavour>/<L>_<U>_<N>/<plot>.pkl.
+    Jobs whose result files exist and were computed with the same
+    parameters are skipped unless *overwrite* is True.  Returns the
+    list of (plot, flavour, wall time) of the jobs run.
+    """
+
+    jobs = []
+    for flavour in flavours:
+        config = abb_config(flavours[flavour], L, U, N)
+
+        path = os.path.dirname(abb_result_path(out, flavour, '', L, U, N))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        for plotname in plots:
+            path = abb_result_path(out, flavour, plotname, L, U, N)
+            if overwrite or abb_load(path, config) is None:
+                jobs.append((plotname, flavour, config, out))
+
+    logging.info("ABB: jobs: %d (%d done), workers: %d",
+                 len(jobs), len(flavours) * len(plots) - len(jobs), workers)
+
+    if workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        results = pool.imap_unordered(_abb_job, jobs)
+    else:
+        pool = None
+        results = (_abb_job(job) for job in jobs)
+
+    t0 = time.time()
+    times = []
+    try:
+        for plotname, flavour, dt in results:
+            times.append((plotname, flavour, dt))
+            logging.info("ABB: %-12s %-6s %8.2fs (%d/%d)",
+                         flavour, plotname, dt, len(times), len(jobs))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    logging.info("ABB: wall time: %.2fs, job time: %.2fs",
+                 time.time() - t0, sum(dt for _, _, dt in times))
+
+    return times
+
+
+def abb_collect(flavour, flags, plots, L=0.0, U=800.0, N=801, out='out'):
+    """Collect the per-plot results of *flavour* (with the kernel
+    *flags*) into out/abb_<flavour>.pkl.
+
+    Plots without results (computed with the same parameters) are left
+    out and logged.  Returns the dict of plot results.
+    """
+
+    config = abb_config(flags, L, U, N)
+
+    results = {}
+    for plotname in plots:
+        path   = abb_result_path(out, flavour, plotname, L, U, N)
+        result = abb_load(path, config)
+        if result is None:
+            logging.warning("ABB: no result for %s %s", flavour, plotname)
+            continue
+        results[plotname] = result
+
+    with open(os.path.join(out, 'abb_%s.pkl' % flavour), 'w') as f:
+        pickle.dump(results, f)
+
+    return results
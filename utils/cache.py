@@ -0,0 +1,160 @@
+"""Persistent on-disk cache of assembled projection matrices.
+
+Each entry is a directory, named by a hash of the kernel parameters,
+the method name and settings, the mesh (L, U, N) and the cache format
+version, that holds the projection matrix A and the quadrature weights
+P as .npy files.  The parameters are the attributes listed in the
+*cache_parameters* of the kernel and method classes; kernels that do
+not list their parameters are never cached.
+Entries are loaded memory-mapped, and the least recently used entries
+are evicted once the cache grows beyond its size limit.
+
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+# bump whenever the matrices or their storage change
+format_version = 2
+
+
+def canonical(v):
+    """Return a stable, hashable representation of *v*."""
+
+    if isinstance(v, np.ndarray):
+        return ('array', v.shape, tuple(repr(float(z)) for z in v.ravel()))
+    if isinstance(v, (list, tuple)):
+        return tuple(canonical(z) for z in v)
+    if isinstance(v, dict):
+        return tuple((k, canonical(v[k])) for k in sorted(v))
+    if isinstance(v, (float, np.floating)):
+        return repr(float(v))
+    if isinstance(v, (bool, int, long, str, type(None))):
+        return v
+    raise TypeError("can't use %s as a cache parameter" % type(v).__name__)
+
+
+def parameters(obj):
+    """Return the canonical parameters of *obj* (the attributes listed in
+    its *cache_parameters*)."""
+
+    return (type(obj).__name__,
+            tuple((k, canonical(getattr(obj, k, None))) for k in obj.cache_parameters))
+
+
+class MatrixCache(object):
+    """Cache of projection matrices in the directory *path*.
+
+    The total size of the cache is kept below *max_bytes* by removing
+    the least recently used entries.
+    """
+
+    def __init__(self, path='cache', max_bytes=2**32):
+
+        self.path = path
+        self.max_bytes = max_bytes
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+
+    def cacheable(self, kernel, method):
+        """Return True if the parameters of *kernel* and *method* are listed."""
+
+        return (getattr(kernel, 'cache_parameters', None) is not None
+                and getattr(method, 'cache_parameters', None) is not None)
+
+
+    def key(self, kernel, method):
+        """Return the cache key of the matrix of *kernel* sampled by *method*."""
+
+        k = repr((format_version, parameters(kernel), parameters(method)))
+
+        return hashlib.sha1(k).hexdigest()
+
+
+    def load(self, kernel, method):
+        """Load the matrices of *method* from the cache.
+
+        Returns True if the entry was found.
+        """
+
+        if not self.cacheable(kernel, method):
+            return False
+
+        entry = os.path.join(self.path, self.key(kernel, method))
+        if not os.path.isdir(entry):
+            return False
+
+        method.A = np.load(os.path.join(entry, 'A.npy'), mmap_mode='r')
+        method.P = np.load(os.path.join(entry, 'P.npy'), mmap_mode='r')
+
+        # mark as recently used
+        os.utime(entry, None)
+
+        logging.debug("CACHE: hit: %s, %s, %d", kernel.name, method.name, method.N)
+
+        return True
+
+
+    def store(self, kernel, method):
+        """Store the matrices of *method* in the cache."""
+
+        if not isinstance(method.A, np.ndarray) or method.F is not None:
+            return
+        if not self.cacheable(kernel, method):
+            return
+
+        entry = os.path.join(self.path, self.key(kernel, method))
+        if os.path.isdir(entry):
+            return
+
+        # write to a temporary directory first so that partially
+        # written entries are never loaded
+        tmp = tempfile.mkdtemp(dir=self.path, prefix='.tmp')
+        np.save(os.path.join(tmp, 'A.npy'), method.A)
+        np.save(os.path.join(tmp, 'P.npy'), method.P)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp)
+
+        logging.debug("CACHE: store: %s, %s, %d", kernel.name, method.name, method.N)
+
+        self.evict()
+
+
+    def entries(self):
+        """Return (last use, size, path) of all entries, oldest first."""
+
+        r = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f))
+                       for f in os.listdir(entry))
+            r.append((os.path.getmtime(entry), size, entry))
+
+        return sorted(r)
+
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits."""
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logging.debug("CACHE: evict: %s", entry)
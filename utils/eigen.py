@@ -0,0 +1,91 @@
+"""Dominant eigenvalues (growth rates) of nonnegative projection operators.
+
+The dominant eigenvalue of a nonnegative operator is computed with
+the power method, which only needs matrix-vector products and so
+works with dense, sparse, low rank and structured (eg, Toeplitz)
+operators alike.  For any positive vector v, the Collatz-Wielandt
+bounds
+
+  min_i (A v)_i / v_i  <=  lambda  <=  max_i (A v)_i / v_i
+
+bracket the dominant eigenvalue.  Since the tails of the iterates
+underflow, the ratios are only taken over the entries of v above a
+floor, so that the min and max are estimates of the bounds (not
+rigorous bounds), and the iteration stops as soon as the estimates
+agree.  If the power method does not converge (eg, if the subdominant
+eigenvalue is close to the dominant one), ARPACK is used instead,
+started from the last iterate.
+
+"""
+
+import logging
+
+import numpy as np
+
+
+def collatz_wielandt(v, w, floor=1e-3):
+    """Return estimates of the Collatz-Wielandt bounds of w = A v.
+
+    Only the entries of *v* that are larger than *floor* times its
+    largest entry are used, to avoid ratios of underflowing tails, so
+    the returned min and max ratios are not rigorous bounds.
+    """
+
+    m = v > floor * v.max()
+    r = w[m] / v[m]
+
+    return r.min(), r.max()
+
+
+def dominant_eigenpair(A, n, v0=None, tol=1e-12, maxiter=100, floor=1e-3):
+    """Return the dominant eigenvalue and (positive) eigenvector of *A*.
+
+    *A* is either a function that computes matrix-vector products, or
+    an object with a *dot* method (eg, a matrix or LinearOperator) of
+    size *n*.  The iteration is started from *v0* if given (a warm
+    start), and stops when the estimates of the Collatz-Wielandt bounds
+    agree to the relative tolerance *tol* (with each other and with
+    those of the previous iteration).
+    """
+
+    matvec = getattr(A, 'dot', A)
+
+    if v0 is None:
+        v = np.ones(n)
+    else:
+        v = abs(np.asarray(v0, dtype=float))
+        v = v + np.finfo(float).eps * v.max()
+
+    v = v / v.max()
+
+    lam = None
+    for k in xrange(maxiter):
+
+        w = matvec(v)
+        lo, hi = collatz_wielandt(v, w, floor)
+
+        v = w / w.max()
+
+        # the estimates of a concentrated iterate can agree by chance,
+        # so they also have to agree with those of the previous iterate
+        converged = (hi - lo <= tol * hi and lam is not None
+                     and abs(0.5 * (lo + hi) - lam) <= tol * hi)
+        lam = 0.5 * (lo + hi)
+
+        if converged:
+            logging.debug("EIGEN: power: %d iterations, lambda: %.15g", k+1, hi)
+            return lam, v
+
+    logging.debug("EIGEN: power: no convergence (%g, %g), using ARPACK", lo, hi)
+
+    from scipy.sparse.linalg import LinearOperator
+    from scipy.sparse.linalg.eigen import eigs
+
+    op = LinearOperator((n, n), matvec=matvec, dtype=float)
+    evals, evecs = eigs(op, k=1, v0=v, tol=tol, which='LM')
+
+    v = evecs[:, 0].real
+    v = v / v[abs(v).argmax()]
+
+    return evals[0].real, v
+
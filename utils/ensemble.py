@@ -0,0 +1,139 @@
+"""Parameter uncertainty ensembles for the ARTR kernel.
+
+Each draw of the ensemble redraws the kernel parameters every year
+(see ARTTRI.draw_parameters), re-samples the projection matrix with
+the drawn parameters, and projects the initial measurements through
+all years.  Draws are independent and are fanned out over a process
+pool.  Every draw has its own random stream, seeded from a master
+seed, so that ensembles are reproducible regardless of the number of
+workers.
+
+"""
+
+import logging
+import multiprocessing
+
+import numpy as np
+
+
+# per process kernel and method (see _artr_init)
+_artr = {}
+
+
+def _artr_init(config):
+
+    from kernels.artr import ARTTRI
+    from methods.midpoint import MidPoint
+
+    kernel = ARTTRI()
+    method = MidPoint()
+
+    kernel.mortality_type = config['mortality']
+    kernel.fecundity_type = config['fecundity']
+    kernel.setup(method, config['N'], shift=config['shift'])
+
+    _artr['kernel'] = kernel
+    _artr['method'] = method
+    _artr['juvenile_mask'] = method.x <  config['adult_cutoff']
+    _artr['adult_mask']    = method.x >= config['adult_cutoff']
+
+
+def _artr_draw(seed):
+
+    kernel = _artr['kernel']
+    method = _artr['method']
+    juvenile_mask = _artr['juvenile_mask']
+    adult_mask    = _artr['adult_mask']
+
+    rng = np.random.RandomState(seed)
+    T   = kernel.T
+
+    projections = np.zeros((len(T)+1, len(method.x)))
+    populations = np.zeros(len(T)+1)
+    juveniles   = np.zeros(len(T)+1)
+    adults      = np.zeros(len(T)+1)
+
+    n0 = method.histogram(kernel.n0)
+
+    projections[0] = n0
+    populations[0] = sum(n0)
+    juveniles[0]   = sum(n0 * juvenile_mask)
+    adults[0]      = sum(n0 * adult_mask)
+
+    # same climate row as after setup
+    kernel.row = 1
+
+    for j, t in enumerate(T):
+
+        # draw the parameters and sample the matrix with them (with
+        # the climate row of the previous year, as in ARTTRI.update)
+        kernel.draw_parameters(t, rng)
+        if j > 0:
+            method.sample(kernel, t)
+
+        kernel.row = int(kernel.climate_row(t))
+
+        if j == 0:
+            n1 = kernel.first_projection()
+        else:
+            n1 = kernel.project(n0)
+
+        if kernel.fecundity_type == 'population':
+            n1 += kernel.population_fecundity(n0)
+
+        projections[j+1] = n1
+        populations[j+1] = method.total_population(n1)
+        juveniles[j+1]   = method.total_population(n1 * juvenile_mask)
+        adults[j+1]      = method.total_population(n1 * adult_mask)
+
+        n0 = n1
+
+    return projections, populations, juveniles, adults
+
+
+def artr_ensemble(draws, workers=1, N=400, mortality='noexp',
+                  fecundity='uniform_noexp', adult_cutoff=0.0, shift=False,
+                  seed=None):
+    """Run an ensemble of *draws* parameter draws of the ARTR kernel.
+
+    The draws are run on a pool of *workers* processes.  The random
+    streams of the draws are seeded from the master *seed*.  If *shift*
+    is True, the matrices are sampled as shifted stencils (see
+    methods.shift), which is faster but not exact.
+
+    Returns a dict with the arrays 'projections' (draws x years+1 x
+    N), 'populations', 'juveniles' and 'adults' (draws x years+1).
+    """
+
+    config = {
+        'N':            N,
+        'mortality':    mortality,
+        'fecundity':    fecundity,
+        'adult_cutoff': adult_cutoff,
+        'shift':        shift,
+    }
+
+    seeds = np.random.RandomState(seed).randint(0, 2**31 - 1, size=draws)
+
+    logging.info("ENSEMBLE: ARTR: draws: %d, workers: %d", draws, workers)
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _artr_init, (config,))
+        try:
+            results = pool.map(_artr_draw, seeds,
+                               chunksize=max(1, draws / (4 * workers)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _artr_init(config)
+        results = map(_artr_draw, seeds)
+
+    projections, populations, juveniles, adults = map(np.asarray, zip(*results))
+
+    return {
+        'projections': projections,
+        'populations': populations,
+        'juveniles':   juveniles,
+        'adults':      adults,
+    }
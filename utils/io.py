@@ -23,3 +23,17 @@ def read_csv(filename, header=True):
       rows.append(record._make(row))
       
   return rows
+
+
+def read_columns(filename, dtype=float):
+  """Read a CSV file (with a header) into a dict of column arrays."""
+
+  rows = read_csv(filename)
+  if not rows:
+    return {}
+
+  columns = {}
+  for name in rows[0]._fields:
+    columns[name] = np.array([ getattr(r, name) for r in rows ], dtype=dtype)
+
+  return columns
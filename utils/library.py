@@ -0,0 +1,180 @@
+"""Per-year projection matrix library for stochastic environments.
+
+The only thing that changes between the years of time dependent
+kernels like ARTTRI is the climate row.  A MatrixLibrary samples the
+projection matrix once for every (distinct) climate row and stacks
+them, in memory or in a memory-mapped .npy file.  Environment
+sequences are then drawn as indices into the library (iid or Markov),
+and populations are projected without re-assembling any matrix.
+
+"""
+
+import copy
+import logging
+
+import numpy as np
+
+
+class MatrixLibrary(object):
+    """Projection matrices of *kernel* for the climate rows *rows*.
+
+    The kernel must be set up with a method.  By default, all rows of
+    the climate table are used.  If *path* is given, the matrices are
+    stored in a memory-mapped .npy file at *path*.
+
+    The matrices are sampled with a copy of the method, so that the
+    matrix the kernel holds is left alone.  They are stored in the
+    precision of the method, and if the method has a *sparse_tol*, as
+    sparse (CSR) matrices of their significant entries (in memory
+    only).
+    """
+
+    def __init__(self, kernel, rows=None, path=None):
+
+        # sample with a copy of the method (without its matrices)
+        method = copy.copy(kernel.method)
+        method.A = None
+        method.F = method.R = None
+
+        if rows is None:
+            rows = range(len(kernel.climate['year']))
+
+        rows  = sorted(set(int(r) for r in rows))
+        N     = len(method.x)
+        dtype = np.float32 if method.precision == 'single' else float
+
+        if method.sparse_tol:
+            if path:
+                raise ValueError("sparse libraries can't be memory-mapped")
+            A = [ None ] * len(rows)
+        elif path:
+            A = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                          shape=(len(rows), N, N))
+        else:
+            A = np.empty((len(rows), N, N), dtype=dtype)
+
+        row = kernel.row
+        for j, r in enumerate(rows):
+            kernel.row = r
+            t = int(kernel.climate['year'][r])
+            method.sample(kernel, t)
+
+            Aj = self.full_matrix(kernel, method)
+            if method.sparse_tol:
+                Aj = method.truncate(Aj).astype(dtype)
+            A[j] = Aj
+
+            logging.debug("LIBRARY: %s: climate row: %d (%d)", kernel.name, r, t)
+
+        # restore the kernel
+        kernel.row = row
+
+        if path:
+            A.flush()
+
+        self.A     = A
+        self.P     = np.array(method.P)
+        self.N     = N
+        self.dtype = np.dtype(dtype)
+        self.rows  = rows
+        self.name  = kernel.name
+
+
+    def full_matrix(self, kernel, method):
+        """Return the dense projection matrix sampled by *method*,
+        including low rank terms and population level fecundity."""
+
+        A = method.A
+        if hasattr(A, 'toarray'):
+            A = A.toarray()
+        if method.F is not None:
+            A = A + np.dot(method.F, method.R.T)
+
+        if getattr(kernel, 'fecundity_type', None) == 'population':
+            # population fecundity is linear in the population
+            N = A.shape[1]
+            A = A + np.column_stack([ kernel.population_fecundity(e)
+                                      for e in np.eye(N) ])
+
+        return A
+
+
+    def apply(self, j, n):
+        """Return the product of the matrix of index *j* with *n* (in
+        double precision)."""
+
+        if self.dtype == np.float32:
+            return self.A[j].dot(np.asarray(n, dtype=np.float32)).astype(float)
+
+        return self.A[j].dot(n)
+
+
+    def __len__(self):
+        return len(self.rows)
+
+
+    def index(self, row):
+        """Return the library index of the climate row *row*."""
+
+        return self.rows.index(row)
+
+
+    def iid(self, T, p=None, rng=np.random):
+        """Return *T* iid library indices, drawn with probabilities *p*."""
+
+        return rng.choice(len(self), size=T, p=p)
+
+
+    def markov(self, T, Q, j0=0, rng=np.random):
+        """Return *T* library indices of the Markov chain with transition
+        matrix *Q* (Q[i, j] is the probability of moving from i to j)
+        started at *j0*."""
+
+        C = np.cumsum(Q, axis=1)
+        u = rng.uniform(size=T)
+
+        seq = np.empty(T, dtype=int)
+        j = j0
+        for k in xrange(T):
+            j = min(np.searchsorted(C[j], u[k] * C[j, -1], 'right'), len(self) - 1)
+            seq[k] = j
+
+        return seq
+
+
+    def project(self, n, j):
+        """Project the population *n* with the matrix of index *j*."""
+
+        return self.apply(j, n)
+
+
+    def projections(self, n0, sequence):
+        """Return the projections of *n0* through the environment *sequence*."""
+
+        n = np.empty((len(sequence)+1, len(n0)))
+        n[0] = n0
+        for k, j in enumerate(sequence):
+            n[k+1] = self.apply(j, n[k])
+
+        return n
+
+
+    def stochastic_growth_rate(self, sequence, n0=None, burn_in=0):
+        """Estimate the stochastic growth rate lambda_s along *sequence*.
+
+        The population is normalised after every step, and log lambda_s
+        is the average of the one step log growth rates after the first
+        *burn_in* steps.
+        """
+
+        n = np.ones(self.N) if n0 is None else np.array(n0, dtype=float)
+        n = n / np.dot(self.P, n)
+
+        r = np.empty(len(sequence))
+        for k, j in enumerate(sequence):
+            n = self.apply(j, n)
+            p = np.dot(self.P, n)
+            r[k] = np.log(p)
+            n = n / p
+
+        return np.exp(np.mean(r[burn_in:]))
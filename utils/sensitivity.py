@@ -0,0 +1,150 @@
+"""Sensitivity and elasticity of the asymptotic growth rate.
+
+If v and w are the right and left dominant eigenvectors of the
+projection matrix A, the sensitivity of lambda to the entries of A is
+the rank one matrix
+
+  S[i, j] = w[i] v[j] / <w, v>
+
+and the elasticity is E[i, j] = A[i, j] S[i, j] / lambda.  For a
+kernel sampled as A[i, j] = P[j] k(x[j], y[i]), with quadrature
+weights P, the sensitivity and elasticity kernels are
+
+  s(y[i], x[j]) = S[i, j] / P[i],    e(y[i], x[j]) = k(x[j], y[i]) s(y[i], x[j]) / lambda
+
+and the elasticity kernel integrates to one.  Discrete stages (eg,
+the seedling stages of the Zuidema kernel) have unit weights.
+
+Sensitivities are kept as rank one factors, and the elasticity
+marginals are computed with two operator products, so that no N x N
+matrix is formed unless asked for (see Sensitivity.elasticity_kernel).
+
+"""
+
+import numpy as np
+
+
+class RankOne(object):
+    """Matrix outer(u, r) stored by its factors."""
+
+    def __init__(self, u, r):
+
+        self.u = np.asarray(u, dtype=float)
+        self.r = np.asarray(r, dtype=float)
+        self.shape = (len(self.u), len(self.r))
+        self.dtype = np.dtype(float)
+
+
+    def dot(self, x):
+        """Return the product of the matrix with *x* (a vector, or columns)."""
+
+        return np.multiply.outer(self.u, np.dot(self.r, x))
+
+
+    @property
+    def T(self):
+        return RankOne(self.r, self.u)
+
+
+    def sum(self, axis=None):
+        if axis is None:
+            return self.u.sum() * self.r.sum()
+        if axis == 0:
+            return self.u.sum() * self.r
+        return self.u * self.r.sum()
+
+
+    def toarray(self):
+        """Return the matrix as a dense array."""
+
+        return np.outer(self.u, self.r)
+
+
+def quadrature_weights(kernel):
+    """Return the quadrature weights of the state vector of *kernel*.
+
+    Discrete stages (in front of the mesh points) have unit weights.
+    """
+
+    P = np.asarray(kernel.method.P, dtype=float)
+    return np.concatenate([ np.ones(len(kernel.x) - len(P)), P ])
+
+
+class Sensitivity(object):
+    """Sensitivity and elasticity of the growth rate of *kernel*.
+
+    The right and left dominant eigenvectors are computed together
+    (see Kernel.eigenpair) with the relative tolerance *tol*.
+    """
+
+    def __init__(self, kernel, tol=1e-12, maxiter=100):
+
+        lam, v  = kernel.eigenpair(tol, maxiter)
+        lamw, w = kernel.eigenpair(tol, maxiter, left=True)
+
+        P = quadrature_weights(kernel)
+
+        self.kernel = kernel
+        self.lam = lam
+        self.v = v / np.dot(P, v)
+        self.w = w / np.dot(w, self.v)
+        self.P = P
+
+        # relative difference of the two eigenvalue estimates
+        self.error = abs(lam - lamw) / lam
+
+
+    @property
+    def matrix_sensitivity(self):
+        """Sensitivity of lambda to the entries of the projection matrix."""
+
+        return RankOne(self.w, self.v)
+
+
+    @property
+    def sensitivity_kernel(self):
+        """Sensitivity kernel s(y, x) at the mesh points (rows are y)."""
+
+        return RankOne(self.w / self.P, self.v)
+
+
+    @property
+    def reproductive_value(self):
+        """Left eigenfunction (reproductive value) at the mesh points."""
+
+        return self.w / self.P
+
+
+    @property
+    def stable_distribution(self):
+        """Right eigenfunction (stable distribution, integrating to one)."""
+
+        return self.v
+
+
+    def elasticity_marginals(self):
+        """Return the marginals of the elasticity kernel.
+
+        Returns (ey, ex), where ey(y) is the integral of e(y, x) over x
+        and ex(x) the integral over y.  Both integrate to one.
+        """
+
+        k = self.kernel
+
+        ey = self.w * k.project(self.v) / (self.lam * self.P)
+        ex = self.v * k.rproject(self.w) / (self.lam * self.P)
+
+        return ey, ex
+
+
+    def elasticity_kernel(self):
+        """Return the elasticity kernel e(y, x) at the mesh points.
+
+        This forms the (dense) projection matrix.
+        """
+
+        A = self.kernel.projection_matrix
+        if hasattr(A, 'toarray'):
+            A = A.toarray()
+
+        return A * np.outer(self.w / self.P, self.v / self.P) / self.lam